@@ -0,0 +1,99 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+from modules.game_state import GameState, load_map
+from modules.level_analyzer import LevelAnalyzer, load_benchmark_results
+from modules.move_ordering import supports_ordering
+from modules.solver import Solver
+
+# Runs every combination of map, method, heuristic and move ordering in its own process (so a run can be stopped at
+# the timeout) and prints the search statistics side by side, e.g. to compare move orderings by their expanded nodes.
+# Combinations a method does not support (killer and history orderings for dfs) are skipped.
+# With --save, the results are stored together with the features of each map, to calibrate '--method auto'.
+
+DEFAULT_MAPS = ['maps/maps/sokoban1.txt', 'maps/test_maps/demo1.txt', 'maps/test_maps/d3.txt']
+DEFAULT_METHODS = ['dfs', 'iddfs', 'idas']
+DEFAULT_HEURISTICS = ['manhattan']
+DEFAULT_ORDERINGS = ['fixed', 'heuristic', 'push', 'inertia', 'killer', 'history']
+
+
+def run(map_name, method, heuristic, ordering, results):
+    game_state = GameState(load_map(map_name))
+    solver = Solver(game_state, method, map_name, move_ordering=ordering, heuristic=heuristic)
+    with contextlib.redirect_stdout(io.StringIO()):
+        solver.solve()
+    results.put({
+        'solved': solver.get_solution() is not None,
+        'moves': solver.moves_to_target,
+        'expanded_nodes': solver.expanded_nodes,
+        'states_generated': solver.states_generated,
+        'time': solver.time,
+    })
+
+
+def benchmark(map_name, method, heuristic, ordering, timeout):
+    """Run the solver in a separate process, returns None if it did not finish in time"""
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=run, args=(map_name, method, heuristic, ordering, results))
+    process.start()
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        return None
+    return results.get() if not results.empty() else None
+
+
+def save(path, records):
+    """Add the records to the saved benchmark results, replacing earlier runs of the same configuration"""
+    def configuration(record):
+        return record['map'], record['method'], record['heuristic'], record['ordering']
+
+    replaced = {configuration(record) for record in records}
+    saved = [record for record in load_benchmark_results(path) if configuration(record) not in replaced]
+    with open(path, 'w') as f:
+        json.dump(saved + records, f, indent=1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--maps', help='Map files to benchmark', nargs='+', default=DEFAULT_MAPS)
+    parser.add_argument('--methods', help='Solve methods to benchmark', nargs='+', default=DEFAULT_METHODS)
+    parser.add_argument('--heuristics', help='Heuristics to benchmark (manhattan, pushdist)', nargs='+',
+                        default=DEFAULT_HEURISTICS)
+    parser.add_argument('--orderings', help='Move orderings to benchmark', nargs='+', default=DEFAULT_ORDERINGS)
+    parser.add_argument('--timeout', help='Time limit for each run, in seconds', type=float, default=60)
+    parser.add_argument('--save', help='Store the results with the map features in this file (used by --method auto)',
+                        default=None)
+    args = parser.parse_args()
+
+    records = []
+    print(f"{'map':<30} {'method':<18} {'heuristic':<10} {'ordering':<16} {'moves':>7} {'expanded':>10} "
+          f"{'generated':>10} {'time (s)':>9}")
+    for map_name in args.maps:
+        features = LevelAnalyzer(GameState(load_map(map_name))).analyze() if args.save else None
+        for method in args.methods:
+            for heuristic in args.heuristics:
+                for ordering in args.orderings:
+                    if not supports_ordering(method, ordering):
+                        continue
+                    result = benchmark(map_name, method, heuristic, ordering, args.timeout)
+                    label = f"{map_name:<30} {method:<18} {heuristic:<10} {ordering:<16}"
+                    if result is None:
+                        print(f"{label} {'timed out':>7}")
+                        result = {'solved': False, 'moves': 0, 'expanded_nodes': None, 'states_generated': None,
+                                  'time': args.timeout}
+                    elif not result['solved']:
+                        print(f"{label} {'no solution':>7} {result['expanded_nodes']:>10} "
+                              f"{result['states_generated']:>10} {result['time']:>9.3f}")
+                    else:
+                        print(f"{label} {result['moves']:>7} {result['expanded_nodes']:>10} "
+                              f"{result['states_generated']:>10} {result['time']:>9.3f}")
+                    records.append(dict(result, map=map_name, method=method, heuristic=heuristic, ordering=ordering,
+                                        features=features))
+
+    if args.save:
+        save(args.save, records)
+        print(f"Saved {len(records)} results to {args.save}")
@@ -1,34 +1,28 @@
 import argparse
-from modules.game_state import GameState
+from modules.game_state import GameState, load_map
 from modules.game_visualization import GameVisualization
+from modules.shared_level import solve_in_workers
 from modules.solver import Solver
 
-def load_map(map_path):
-    """Load the map from the given path"""
-    f = open(map_path, 'r')
-    map = []
-    maxl = 0
-    for line in f:
-        _line = line.rstrip()
-        map.append(list(_line))
-        l = len(list(_line))
-        if l > maxl:
-            maxl = l
-
-    for line in map:
-        ldiff = abs(maxl - len(line))
-        line += [' '] * ldiff
-    f.close()
-    return map
-
-def engine(map_name, method):
+def engine(map_name, method, symmetry=True, **search_options):
     map = load_map(f'{map_name}')
 
     game_state = GameState(map)
     print(f"Using strategy: {method}")
-    solver = Solver(game_state, method, map_name)
-    solver.solve()
-    solution = solver.get_solution()
+    if ',' in method:
+        # Several strategies: race them in worker processes sharing one level store, keep the first solution
+        found = solve_in_workers(game_state, method.split(','), map_name=map_name, symmetry=symmetry, **search_options)
+        solution = None
+        if found is not None:
+            strategy, solution, stats = found
+            print(f"{map_name}, {method} > Solved by {strategy}: {len(solution)} moves, {stats['expanded_nodes']} nodes "
+                  f"expanded in {stats['time']:.3f}s (worker startup {stats['startup_time'] * 1000:.1f}ms)")
+        else:
+            print(f"{map_name}, {method} > No solution found")
+    else:
+        solver = Solver(game_state, method, map_name, symmetry=symmetry, **search_options)
+        solver.solve()
+        solution = solver.get_solution()
 
     if solution is None:
         solution = []
@@ -39,9 +33,40 @@ def engine(map_name, method):
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--map', help='Directory to map file', default='maps/demo.txt')
-    parser.add_argument('--method', help='Solve method (bfs, dfs, astar, etc.)', default='astar')
+    parser.add_argument('--method', help='Solve method (bfs, dfs, astar, etc., or auto to choose from the map); several comma-separated '
+                        'methods run in parallel worker processes and the first solution is kept', default='astar')
+    parser.add_argument('--no-symmetry', help='Do not merge mirrored or rotated states of symmetric levels', action='store_true')
+    parser.add_argument('--depth', help='Depth limit for dfs_limited_depth', type=int, default=10)
+    parser.add_argument('--depth-start', help='Initial depth limit for iddfs', type=int, default=1)
+    parser.add_argument('--depth-step', help='Depth limit increase per iddfs iteration', type=int, default=1)
+    parser.add_argument('--cycle-check', help='Duplicate detection for dfs_limited_depth and iddfs: depth (shallowest depth '
+                        'per state) or path (current path only, O(depth) memory)', choices=['depth', 'path'], default='depth')
+    parser.add_argument('--ordering', help='Move ordering for dfs, dfs_limited_depth, iddfs and idas, e.g. heuristic or '
+                        'push,inertia (fixed, heuristic, push, inertia; killer and history not with dfs)', default=None)
+    parser.add_argument('--closed-set', help='Visited state storage: exact, fingerprint, bloom or bitstate, optionally with '
+                        'a log2 size, e.g. bloom:30', default='exact')
+    parser.add_argument('--optimize', help='Shorten the solution after the search', action='store_true')
+    parser.add_argument('--heuristic', help='Heuristic for informed searches: manhattan or pushdist (push distances to the '
+                        'nearest targets)', choices=['manhattan', 'pushdist'], default=None)
+    parser.add_argument('--max-expansions', help='Give up after expanding this many nodes', type=int, default=None)
+    parser.add_argument('--calibration', help='Benchmark results used by --method auto (see benchmark.py --save)',
+                        default='benchmark_results.json')
+    parser.add_argument('--checkpoint', help='Periodically save the bfs or astar search to this file (FILE.<method> for '
+                        'each of several comma-separated methods)', default=None)
+    parser.add_argument('--checkpoint-interval', help='Seconds between checkpoints', type=float, default=60)
+    parser.add_argument('--resume', help='Continue the search saved in the --checkpoint file', action='store_true')
     args = parser.parse_args()
+    if args.depth_start < 0:
+        parser.error('--depth-start must be at least 0')
+    if args.depth_step < 1:
+        parser.error('--depth-step must be at least 1')
+    if args.resume and args.checkpoint is None:
+        parser.error('--resume requires --checkpoint')
 
-    engine(args.map, args.method)
+    engine(args.map, args.method, symmetry=not args.no_symmetry, max_depth=args.depth, depth_start=args.depth_start,
+           depth_step=args.depth_step, cycle_check=args.cycle_check, move_ordering=args.ordering,
+           closed_set=args.closed_set, optimize=args.optimize, heuristic=args.heuristic,
+           max_expansions=args.max_expansions, calibration=args.calibration, checkpoint=args.checkpoint,
+           checkpoint_interval=args.checkpoint_interval, resume=args.resume)
 
-    print("Action completed")
\ No newline at end of file
+    print("Action completed")
\ No newline at end of file
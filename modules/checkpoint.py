@@ -0,0 +1,263 @@
+"""
+Resumable search checkpoints for the sokoban solver (bfs and astar)
+A checkpoint file is an append-only log of the search. While the search runs, it records every frontier entry it
+pushes (entry id, parent entry id, move, priority, player and box positions) and the id of every entry it pops. At
+each checkpoint the events recorded since the previous checkpoint are handed to a background thread, which appends
+them to the file as one segment together with the search counters. A checkpoint therefore only costs the search a
+list swap, and the writer's work is proportional to what changed since the previous checkpoint, not to the size of
+the frontier and closed set.
+On resume the log is replayed: the frontier is the pushed entries that were not popped (with their paths rebuilt
+from the parent ids), and the closed set is rebuilt by marking the logged states visited in their original order.
+Frontier entries are totally ordered (by their position in the bfs queue, or by (priority, counter) for astar), so
+the resumed search pops them in the same order as the original search and finds the same solution.
+File layout:
+- header: magic b'SKCP', format version (uint16), length of the metadata (uint32), then the metadata as JSON
+  (level checksum, strategy, heuristic, closed set backend, symmetries, map width, number of boxes)
+- segments: compressed length (uint64), CRC-32 of the compressed body (uint32), zlib-compressed body:
+  - counters: states generated, expanded nodes, symmetric states merged (uint64)
+  - length-prefixed sections: pushed entry ids, parent ids, moves (b'UDLR'), priorities (0 for bfs), player and box
+    cells (row * width + column), popped entry ids
+A segment cut short by a crash fails its length or CRC check; it is ignored, and overwritten when the search resumes.
+The module has the following functions and classes:
+- level_checksum(state): identify the level a checkpoint belongs to
+- CheckpointWriter(path, metadata, interval): records the search events and writes them at each checkpoint
+- load_checkpoint(path): read and replay a checkpoint file
+- rebuild_state(initial_state, player, boxes, current_cost): GameState of a frontier entry
+"""
+
+import json
+import queue
+import struct
+import threading
+import time
+import zlib
+from array import array
+from heapq import heapify
+from modules.game_state import GameState
+
+MAGIC = b'SKCP'
+VERSION = 2
+HEADER = struct.Struct('<4sHI')
+SEGMENT = struct.Struct('<QI')
+COUNTERS = struct.Struct('<QQQ')
+SECTION = struct.Struct('<Q')
+
+
+def level_checksum(state):
+    """Get a checksum of the level layout and start state"""
+    return zlib.crc32(''.join(''.join(row) for row in state.map).encode())
+
+
+class LoggedState(object):
+    # Player and box positions of a logged state: enough to canonicalize it when the closed set is rebuilt
+    def __init__(self, player, boxes):
+        self.player = player
+        self.boxes = boxes
+
+
+class CheckpointWriter(object):
+    def __init__(self, path, metadata, interval=60, resumed=None):
+        """Start a checkpoint log; with resumed (a Checkpoint read from the same path), append to the existing log"""
+        self.path = path
+        self.interval = interval
+        self.width = metadata['width']
+        self.last_time = time.time()
+        self.written = 0
+        self.longest_pause = 0.0
+        self.error = None
+
+        # Events since the last checkpoint: (entry, parent, direction, priority, player, boxes) pushes and popped entry
+        # ids. Only the positions are kept, so that the log does not keep the maps of popped states alive.
+        self.pushes = []
+        self.pops = array('q')
+        self.pushed_count = resumed.pushed_count if resumed is not None else 0
+        self.popped_count = resumed.popped_count if resumed is not None else 0
+
+        if resumed is not None:
+            self.file = open(path, 'r+b')
+            self.file.truncate(resumed.valid_length)
+            self.file.seek(resumed.valid_length)
+        else:
+            self.file = open(path, 'wb')
+            data = json.dumps(metadata).encode()
+            self.file.write(HEADER.pack(MAGIC, VERSION, len(data)) + data)
+            self.file.flush()
+
+        self.segments = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # The following methods are called by the search thread
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def pushed(self, direction, state, entry=None, parent=None, priority=0):
+        """Record a frontier entry; by default (bfs) entries are numbered in push order and their parent is the entry
+        popped last"""
+        if entry is None:
+            entry = self.pushed_count
+        if parent is None:
+            parent = self.popped_count - 1
+        self.pushed_count += 1
+        self.pushes.append((entry, parent, direction, priority, state.player, state.boxes))
+
+    def popped(self, entry=None):
+        """Record that a frontier entry was popped; by default (bfs) the entries are popped in push order"""
+        self.pops.append(self.popped_count if entry is None else entry)
+        self.popped_count += 1
+
+    def due(self):
+        """Check if the interval since the last checkpoint has passed"""
+        return time.time() - self.last_time >= self.interval
+
+    def save(self, states_generated, expanded_nodes, symmetric_states_merged):
+        """Queue the events since the last checkpoint for writing (called between two iterations of the search)"""
+        start_time = time.time()
+        segment = (self.pushes, self.pops, (states_generated, expanded_nodes, symmetric_states_merged))
+        self.pushes = []
+        self.pops = array('q')
+        self.segments.put(segment)
+        self.last_time = time.time()
+        self.longest_pause = max(self.longest_pause, self.last_time - start_time)
+
+    def close(self):
+        """Write the queued checkpoints and stop the writer thread
+            Note: events recorded after the last checkpoint are dropped, a resumed search repeats them
+        """
+        self.segments.put(None)
+        self.thread.join()
+        self.file.close()
+        if self.error is not None:
+            raise self.error
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # The following methods run in the writer thread
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def run(self):
+        while True:
+            segment = self.segments.get()
+            if segment is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self.write(*segment)
+                self.written += 1
+            except Exception as error:
+                self.error = error
+
+    def write(self, pushes, pops, counters):
+        width = self.width
+        entries, parents, priorities, cells = array('q'), array('q'), array('d'), array('I')
+        directions = []
+        for entry, parent, direction, priority, player, boxes in pushes:
+            entries.append(entry)
+            parents.append(parent)
+            directions.append(direction or '-')
+            priorities.append(priority)
+            cells.append(player[0] * width + player[1])
+            cells.extend(row * width + col for row, col in boxes)
+        sections = [entries.tobytes(), parents.tobytes(), ''.join(directions).encode(), priorities.tobytes(),
+                    cells.tobytes(), pops.tobytes()]
+        body = zlib.compress(COUNTERS.pack(*counters) +
+                             b''.join(SECTION.pack(len(section)) + section for section in sections), 1)
+        self.file.write(SEGMENT.pack(len(body), zlib.crc32(body)) + body)
+        self.file.flush()
+
+
+class Checkpoint(object):
+    # Replayed checkpoint log: the counters of the last complete segment, every pushed entry and the popped ids
+    def __init__(self, metadata, valid_length):
+        self.metadata = metadata
+        self.valid_length = valid_length
+        self.counters = (0, 0, 0)
+        self.entries = {}
+        self.push_order = []
+        self.pop_order = []
+        self.pushed_count = 0
+        self.popped_count = 0
+
+    def path(self, entry):
+        """Get the moves from the initial state to the entry's state"""
+        path = []
+        parent, direction = self.entries[entry][:2]
+        while parent != -1:
+            path.append(direction)
+            parent, direction = self.entries[parent][:2]
+        return path[::-1]
+
+    def frontier(self):
+        """Get the (priority, entry id, player, boxes, path) entries that were pushed and not popped, in the order the
+        search will pop them for bfs, as a heap for astar"""
+        popped = set(self.pop_order)
+        frontier = []
+        for entry in self.push_order:
+            if entry not in popped:
+                parent, direction, priority, player, boxes = self.entries[entry]
+                frontier.append((priority, entry, player, boxes, self.path(entry)))
+        if self.metadata['strategy'] != 'bfs':
+            heapify(frontier)
+        return frontier
+
+    def visited_states(self):
+        """Get the states in the order the search marked them visited: bfs marks states when it pushes them (except
+        the initial state), astar when it pops them"""
+        order = self.push_order[1:] if self.metadata['strategy'] == 'bfs' else self.pop_order
+        for entry in order:
+            _, _, _, player, boxes = self.entries[entry]
+            yield LoggedState(player, boxes)
+
+
+def load_checkpoint(path):
+    """Read and replay a checkpoint log, up to its last complete segment"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, metadata_length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise Exception(f'Invalid checkpoint file: {path}')
+    offset = HEADER.size + metadata_length
+    checkpoint = Checkpoint(json.loads(data[HEADER.size:offset]), offset)
+    width, stride = checkpoint.metadata['width'], 1 + checkpoint.metadata['boxes']
+
+    while offset + SEGMENT.size <= len(data):
+        length, crc = SEGMENT.unpack_from(data, offset)
+        body = data[offset + SEGMENT.size:offset + SEGMENT.size + length]
+        if len(body) < length or zlib.crc32(body) != crc:
+            break
+        offset += SEGMENT.size + length
+        checkpoint.valid_length = offset
+
+        body = zlib.decompress(body)
+        checkpoint.counters = COUNTERS.unpack_from(body)
+        sections = []
+        position = COUNTERS.size
+        while position < len(body):
+            (section_length,) = SECTION.unpack_from(body, position)
+            position += SECTION.size
+            sections.append(body[position:position + section_length])
+            position += section_length
+        entries, parents, priorities, cells, pops = array('q'), array('q'), array('d'), array('I'), array('q')
+        for values, section in zip([entries, parents, priorities, cells, pops], sections[:2] + sections[3:]):
+            values.frombytes(section)
+        directions = sections[2].decode()
+
+        for i, entry in enumerate(entries):
+            positions = [divmod(cell, width) for cell in cells[i * stride:(i + 1) * stride]]
+            checkpoint.entries[entry] = (parents[i], directions[i], priorities[i], positions[0], positions[1:])
+            checkpoint.push_order.append(entry)
+        checkpoint.pop_order.extend(pops)
+        checkpoint.pushed_count += len(entries)
+        checkpoint.popped_count += len(pops)
+    return checkpoint
+
+
+def rebuild_state(initial_state, player, boxes, current_cost):
+    """Build the game state with the player and boxes at the given positions on the initial state's level"""
+    map = [[' ' if cell in ['@', '$'] else '.' if cell in ['+', '*'] else cell for cell in row]
+           for row in initial_state.map]
+    for row, col in boxes:
+        map[row][col] = '*' if map[row][col] == '.' else '$'
+    row, col = player
+    map[row][col] = '+' if map[row][col] == '.' else '@'
+    return GameState(map, current_cost, initial_state.tables)
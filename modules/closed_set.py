@@ -0,0 +1,183 @@
+"""
+Closed set (visited states) backends for the sokoban solver
+Every backend maps a state key to a small integer value (the orientation of the state under the level's symmetries,
+or the depth it was reached at) and has the following methods:
+- get(key): get the value stored for the key, None if the key is not in the set, UNKNOWN if the key is probably
+  in the set but its value was not stored
+- add(key, value): store the key with the given value (replacing the previous value), returns True if it was new
+- bytes_per_state(): memory used by the set divided by the number of states in it
+- false_positive_rate(): probability that a state that is not in the set is reported as visited
+The backends are:
+- exact: a dict of the full keys, exact but the largest
+- fingerprint: 64-bit fingerprints of the keys in an open-addressing array, states whose fingerprints collide are
+  merged (with a negligible probability for the state counts a search can reach)
+- bloom / bitstate: a Bloom filter with 3 hash bits (bloom) or a single hash bit (bitstate) per state, no values are
+  stored and states are merged at a rate that grows as the filter fills up, which makes the search incomplete but
+  fits far more states in the same memory
+"""
+
+import math
+import sys
+from array import array
+
+UNKNOWN = -1
+MASK64 = (1 << 64) - 1
+
+
+def fingerprint(key):
+    """Get a well-mixed, non-zero 64-bit fingerprint of the key (splitmix64 finalizer over the key's hash)"""
+    h = hash(key) & MASK64
+    h = ((h ^ (h >> 30)) * 0xbf58476d1ce4e5b9) & MASK64
+    h = ((h ^ (h >> 27)) * 0x94d049bb133111eb) & MASK64
+    h ^= h >> 31
+    return h or 1
+
+
+class ExactClosedSet(object):
+    name = 'exact'
+
+    def __init__(self):
+        self.values = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def add(self, key, value=0):
+        new = key not in self.values
+        self.values[key] = value
+        return new
+
+    def bytes_per_state(self):
+        if not self.values:
+            return 0
+        # Size of the dict itself plus the key tuples, estimated from a sample of the keys
+        sample = [key for key, _ in zip(self.values, range(1000))]
+        key_size = sum(sys.getsizeof(player) + sys.getsizeof(boxes) + sys.getsizeof((player, boxes)) +
+                       sum(sys.getsizeof(box) for box in boxes) for player, boxes in sample) / len(sample)
+        return sys.getsizeof(self.values) / len(self.values) + key_size
+
+    def false_positive_rate(self):
+        return 0.0
+
+
+class FingerprintClosedSet(object):
+    name = 'fingerprint'
+
+    def __init__(self, log2_capacity=10):
+        self.capacity = 1 << log2_capacity
+        self.slots = array('Q', bytes(8 * self.capacity))
+        self.values = array('H', bytes(2 * self.capacity))
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def find(self, fp):
+        """Find the slot of the fingerprint, or the empty slot where it would be stored (linear probing)"""
+        mask = self.capacity - 1
+        index = fp & mask
+        slots = self.slots
+        while slots[index] != 0 and slots[index] != fp:
+            index = (index + 1) & mask
+        return index
+
+    def get(self, key):
+        index = self.find(fingerprint(key))
+        if self.slots[index] == 0:
+            return None
+        return self.values[index]
+
+    def add(self, key, value=0):
+        fp = fingerprint(key)
+        index = self.find(fp)
+        self.values[index] = value
+        if self.slots[index] != 0:
+            return False
+        self.slots[index] = fp
+        self.count += 1
+        if self.count * 2 > self.capacity:
+            self.grow()
+        return True
+
+    def grow(self):
+        """Double the capacity to keep the load factor (and probe lengths) at most 1/2"""
+        slots, values = self.slots, self.values
+        self.capacity *= 2
+        self.slots = array('Q', bytes(8 * self.capacity))
+        self.values = array('H', bytes(2 * self.capacity))
+        for fp, value in zip(slots, values):
+            if fp != 0:
+                index = self.find(fp)
+                self.slots[index] = fp
+                self.values[index] = value
+
+    def bytes_per_state(self):
+        if not self.count:
+            return 0
+        return (self.slots.itemsize + self.values.itemsize) * self.capacity / self.count
+
+    def false_positive_rate(self):
+        # A new state is merged when its fingerprint equals one of the stored fingerprints
+        return self.count / 2 ** 64
+
+
+class BloomClosedSet(object):
+    def __init__(self, log2_bits=27, hashes=3, name='bloom'):
+        self.name = name
+        self.size = 1 << max(log2_bits, 3)
+        self.hashes = hashes
+        self.bits = bytearray(self.size // 8)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def positions(self, key):
+        # Double hashing: the i-th bit is h1 + i * h2 (mod size), with h2 odd so the positions differ
+        fp = fingerprint(key)
+        h1, h2 = fp & 0xffffffff, (fp >> 32) | 1
+        mask = self.size - 1
+        return [(h1 + i * h2) & mask for i in range(self.hashes)]
+
+    def get(self, key):
+        for position in self.positions(key):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return None
+        return UNKNOWN
+
+    def add(self, key, value=0):
+        new = False
+        for position in self.positions(key):
+            byte, bit = position >> 3, 1 << (position & 7)
+            if not self.bits[byte] & bit:
+                self.bits[byte] |= bit
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def bytes_per_state(self):
+        if not self.count:
+            return 0
+        return len(self.bits) / self.count
+
+    def false_positive_rate(self):
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+BACKENDS = ['exact', 'fingerprint', 'bloom', 'bitstate']
+
+
+def make_closed_set(spec='exact'):
+    """Create a closed set from a backend specification 'name' or 'name:log2 size' (e.g. 'bloom:30' for 2^30 bits)"""
+    name, _, size = spec.partition(':')
+    if name not in BACKENDS:
+        raise Exception(f'Invalid closed set backend: {name}')
+    if name == 'exact':
+        return ExactClosedSet()
+    if name == 'fingerprint':
+        return FingerprintClosedSet(int(size) if size else 10)
+    return BloomClosedSet(int(size) if size else 27, 3 if name == 'bloom' else 1, name)
@@ -16,11 +16,31 @@ The game state class has the following methods:
 - find_targets(): find all the targets in the map and return their positions  
 - generate_next_state(direction): generate the next game state by moving the player to the given direction
 - check_solved(): check if the game is solved
+Maps are read from text files with load_map(map_path).
 """
 
 
+def load_map(map_path):
+    """Load the map from the given path"""
+    f = open(map_path, 'r')
+    map = []
+    maxl = 0
+    for line in f:
+        _line = line.rstrip()
+        map.append(list(_line))
+        l = len(list(_line))
+        if l > maxl:
+            maxl = l
+
+    for line in map:
+        ldiff = abs(maxl - len(line))
+        line += [' '] * ldiff
+    f.close()
+    return map
+
+
 class GameState:
-    def __init__(self, map, current_cost=0):
+    def __init__(self, map, current_cost=0, tables=None):
         self.map = map
         self.player = self.find_player()
         self.boxes = self.find_boxes()
@@ -29,6 +49,8 @@ class GameState:
         self.current_cost = current_cost
         self.height = len(self.map)
         self.width = len(self.map[0])
+        # Static level tables (see level_tables.py); when set, the heuristic uses their push distances
+        self.tables = tables
 
     def __eq__(self, other):
         return isinstance(other, type(self)) and self.map == other.map and self.player == other.player
@@ -139,7 +161,10 @@ class GameState:
     def get_heuristic(self):
         """Get the heuristic for the game state
             Note: the heuristic is the sum of the distances from all the boxes to their nearest targets
+            (push distances if the state has level tables, Manhattan distances otherwise)
         """
+        if self.tables is not None:
+            return self.tables.heuristic(self.boxes)
         heuristic = 0
         for box in self.boxes:
             nearest_target_distance = min(abs(box[0] - target[0]) + abs(box[1] - target[1]) for target in self.targets)
@@ -195,14 +220,14 @@ class GameState:
         if self.is_empty((new_x, new_y)): # or self.is_target((new_x, new_y)):
             new_map = self.copy_map_with_player_position(new_x, new_y)
 
-            return GameState(new_map, self.current_cost + 1)
+            return GameState(new_map, self.current_cost + 1, self.tables)
 
         elif self.is_box((new_x, new_y)):
             beyond_x, beyond_y = new_x + dx, new_y + dy
             if self.is_empty((beyond_x, beyond_y)):
                 # print(f"Pushing box from ({new_x}, {new_y}) to ({beyond_x}, {beyond_y})")
                 new_map = self.copy_map_with_player_and_box_position(new_x, new_y, beyond_x, beyond_y)
-                return GameState(new_map, self.current_cost + 1)
+                return GameState(new_map, self.current_cost + 1, self.tables)
             else:
                 # print("Box push invalid: Blocked")
                 pass
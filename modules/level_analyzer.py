@@ -0,0 +1,172 @@
+"""
+Level difficulty estimator and automatic strategy selection for the sokoban solver
+The analyzer computes cheap features of a level before solving it:
+- boxes: number of boxes
+- floor_size: number of cells the player can reach (ignoring boxes)
+- tunnel_ratio: fraction of floor cells with walls on two opposite sides
+- dead_fraction: fraction of floor cells a box can never be pushed to a target from (dead squares)
+- heuristic_gap: push-distance lower bound of the initial state (infinite if a box starts on a dead square)
+- state_space: log10 of an estimate of the number of states (box placements times player positions)
+- probe_solved, probe_expanded: result of a short greedy probe search
+From these features, choose() picks the strategy, heuristic, move ordering and expansion budget for '--method auto'.
+If benchmark results are available (see benchmark.py --save), the choice follows the best method (and its best move
+ordering) on the most similar benchmarked levels; otherwise it follows fixed rules.
+"""
+
+import contextlib
+import io
+import json
+import math
+import os
+from modules.level_tables import LevelTables
+
+PROBE_EXPANSIONS = 200
+NEIGHBOURS = 3
+
+
+def load_benchmark_results(path):
+    """Load the benchmark records saved by benchmark.py --save, an empty list if there are none"""
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def feature_vector(features):
+    # Counts are compared on a log scale, ratios as they are
+    gap = features['heuristic_gap']
+    return [
+        math.log1p(features['boxes']),
+        math.log1p(features['floor_size']),
+        features['tunnel_ratio'],
+        features['dead_fraction'],
+        math.log1p(gap) if gap is not None else 10.0,
+        features['state_space'] / 5,
+        1.0 if features['probe_solved'] else 0.0,
+    ]
+
+
+class LevelAnalyzer(object):
+    def __init__(self, state, tables=None):
+        self.state = state
+        self.tables = tables if tables is not None else LevelTables.build(state)
+        self.features = None
+
+    def analyze(self):
+        """Compute the features of the level"""
+        tables = self.tables
+        width = tables.width
+        floor = [cell for cell, index in enumerate(tables.floor_index) if index != -1]
+
+        def is_wall(row, col):
+            return not (0 <= row < tables.height and 0 <= col < width) or tables.grid[row * width + col] == ord('#')
+
+        tunnels = 0
+        for cell in floor:
+            row, col = divmod(cell, width)
+            if (is_wall(row - 1, col) and is_wall(row + 1, col)) or (is_wall(row, col - 1) and is_wall(row, col + 1)):
+                tunnels += 1
+
+        boxes = len(self.state.boxes)
+        gap = tables.heuristic(self.state.boxes)
+        floor_size = len(floor)
+        state_space = math.log10(math.comb(floor_size, boxes) * max(floor_size - boxes, 1)) if floor_size >= boxes else 0
+        probe_solved, probe_expanded = self.probe()
+
+        self.features = {
+            'boxes': boxes,
+            'floor_size': floor_size,
+            'tunnel_ratio': tunnels / floor_size if floor_size else 0.0,
+            'dead_fraction': sum(tables.dead) / floor_size if floor_size else 0.0,
+            'heuristic_gap': gap if gap != float('inf') else None,
+            'state_space': state_space,
+            'probe_solved': probe_solved,
+            'probe_expanded': probe_expanded,
+        }
+        return self.features
+
+    def probe(self):
+        """Run a short greedy search with push distances, returns (solved, expanded nodes)"""
+        from modules.game_state import GameState
+        from modules.solver import Solver
+
+        state = GameState(self.state.map, self.state.current_cost, self.tables)
+        solver = Solver(state, 'greedy', max_expansions=PROBE_EXPANSIONS)
+        with contextlib.redirect_stdout(io.StringIO()):
+            solver.solve()
+        return solver.get_solution() is not None, solver.expanded_nodes
+
+    def choose(self, results=None):
+        """Choose the strategy, heuristic, move ordering and expansion budget for the level
+            Returns a dict with 'strategy', 'heuristic', 'ordering' (None for the strategy's default), 'max_expansions'
+            (None for no limit), 'fallback' (strategy to run without a budget if the budget runs out, or None) and
+            'reason'
+        """
+        features = self.features if self.features is not None else self.analyze()
+        if features['heuristic_gap'] is None:
+            return {'strategy': 'greedy', 'heuristic': 'pushdist', 'ordering': None, 'max_expansions': 0, 'fallback': None,
+                    'reason': 'a box starts on a dead square, the level cannot be solved'}
+        if results:
+            choice = self.choose_from_results(features, results)
+            if choice is not None:
+                return choice
+        return self.choose_from_rules(features)
+
+    def choose_from_rules(self, features):
+        if features['probe_solved']:
+            return {'strategy': 'greedy', 'heuristic': 'pushdist', 'ordering': None,
+                    'max_expansions': 4 * PROBE_EXPANSIONS,
+                    'fallback': 'astar', 'reason': 'the greedy probe search already solved the level'}
+        if features['state_space'] <= 5:
+            return {'strategy': 'astar', 'heuristic': 'pushdist', 'ordering': None, 'max_expansions': None,
+                    'fallback': None,
+                    'reason': 'small state space, an optimal search is affordable'}
+        return {'strategy': 'greedy', 'heuristic': 'pushdist', 'ordering': None, 'max_expansions': 200000,
+                'fallback': 'astar',
+                'reason': 'large state space, searching greedily first'}
+
+    def choose_from_results(self, features, results):
+        # Nearest benchmarked levels by feature distance
+        target = feature_vector(features)
+        levels = {}
+        for record in results:
+            levels.setdefault(record['map'], record['features'])
+        distances = sorted((math.dist(target, feature_vector(level_features)), name)
+                           for name, level_features in levels.items())
+        neighbours = [name for _, name in distances[:NEIGHBOURS]]
+        if not neighbours:
+            return None
+
+        # Best (method, heuristic) on those levels: most levels solved, then lowest mean time
+        runs = {}
+        for record in results:
+            if record['map'] in neighbours:
+                runs.setdefault((record['method'], record.get('heuristic', 'manhattan')), []).append(record)
+        if not runs:
+            return None
+
+        def score(item):
+            records = item[1]
+            solved = [record for record in records if record['solved']]
+            mean_time = sum(record['time'] for record in records) / len(records)
+            return -len(solved) / len(records), mean_time
+
+        (method, heuristic), records = min(runs.items(), key=score)
+        expanded = [record['expanded_nodes'] for record in records if record['solved']]
+        if not expanded:
+            return None
+
+        # Best move ordering of that method: most levels solved, then fewest expanded nodes (as in benchmark.py)
+        orderings = {}
+        for record in records:
+            if record.get('ordering') is not None:
+                orderings.setdefault(record['ordering'], []).append(record)
+
+        def ordering_score(item):
+            records = item[1]
+            solved = [record['expanded_nodes'] for record in records if record['solved']]
+            return -len(solved) / len(records), sum(solved) / len(solved) if solved else float('inf')
+
+        ordering = min(orderings.items(), key=ordering_score)[0] if orderings else None
+        return {'strategy': method, 'heuristic': heuristic, 'ordering': ordering, 'max_expansions': 4 * max(expanded),
+                'fallback': 'astar', 'reason': f"best on the most similar benchmarked levels: {', '.join(neighbours)}"}
@@ -0,0 +1,93 @@
+"""
+Static per-level tables for the sokoban solver
+The tables only depend on the walls, the targets and the player's starting area, so they are computed once per level.
+All tables are flat sequences indexed by cell (row * width + column):
+- grid: the static layout, b'#' for walls, b'.' for targets and b' ' for everything else
+- floor_index: index of the cell among the floor cells the player can reach (ignoring boxes), -1 for other cells
+- distance: minimum number of pushes to bring a box from the cell to the nearest target (ignoring other boxes),
+  -1 if no target can be reached from the cell
+- dead: 1 for floor cells a box can never leave towards a target (dead squares), 0 otherwise
+The tables class has the following methods:
+- build(state): compute the tables of the state's level
+- heuristic(boxes): the sum of the push distances of the boxes to their nearest targets, infinite if a box is on
+  a dead square
+"""
+
+from collections import deque
+
+DELTAS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
+
+class LevelTables(object):
+    def __init__(self, height, width, grid, floor_index, distance, dead):
+        self.height = height
+        self.width = width
+        self.grid = grid
+        self.floor_index = floor_index
+        self.distance = distance
+        self.dead = dead
+
+    @classmethod
+    def build(cls, state):
+        """Compute the tables of the level of the given game state"""
+        height, width = state.height, state.width
+        grid = bytearray(b' ' * (height * width))
+        for row in range(height):
+            for col in range(width):
+                if state.is_wall((row, col)):
+                    grid[row * width + col] = ord('#')
+                elif state.is_target((row, col)):
+                    grid[row * width + col] = ord('.')
+        grid = bytes(grid)
+
+        def is_open(row, col):
+            return 0 <= row < height and 0 <= col < width and grid[row * width + col] != ord('#')
+
+        # Floor: cells the player can walk to from the start when boxes are ignored
+        floor_index = [-1] * (height * width)
+        start = state.player
+        floor = [start]
+        floor_index[start[0] * width + start[1]] = 0
+        queue = deque([start])
+        while queue:
+            row, col = queue.popleft()
+            for dx, dy in DELTAS:
+                next_row, next_col = row + dx, col + dy
+                if is_open(next_row, next_col) and floor_index[next_row * width + next_col] == -1:
+                    floor_index[next_row * width + next_col] = len(floor)
+                    floor.append((next_row, next_col))
+                    queue.append((next_row, next_col))
+
+        # Push distances: breadth-first search of box pulls from all targets at once. A box at (row, col) can be pulled
+        # to (row + dx, col + dy) when the player stands there and can step back to (row + 2dx, col + 2dy).
+        distance = [-1] * (height * width)
+        queue = deque()
+        for target in state.targets:
+            distance[target[0] * width + target[1]] = 0
+            queue.append(target)
+        while queue:
+            row, col = queue.popleft()
+            for dx, dy in DELTAS:
+                box_row, box_col = row + dx, col + dy
+                if not is_open(box_row, box_col) or not is_open(box_row + dx, box_col + dy):
+                    continue
+                if distance[box_row * width + box_col] == -1:
+                    distance[box_row * width + box_col] = distance[row * width + col] + 1
+                    queue.append((box_row, box_col))
+
+        dead = bytes(1 if floor_index[cell] != -1 and distance[cell] == -1 else 0 for cell in range(height * width))
+        return cls(height, width, grid, floor_index, distance, dead)
+
+    def floor_size(self):
+        return sum(1 for index in self.floor_index if index != -1)
+
+    def heuristic(self, boxes):
+        """Get the sum of the push distances of the boxes to their nearest targets (infinite if a box is dead)"""
+        total = 0
+        width, distance = self.width, self.distance
+        for row, col in boxes:
+            pushes = distance[row * width + col]
+            if pushes < 0:
+                return float('inf')
+            total += pushes
+        return total
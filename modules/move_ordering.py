@@ -0,0 +1,88 @@
+"""
+Move ordering for the depth-first search strategies (dfs, dfs_limited_depth, iddfs, idas)
+The order in which a depth-first search tries the children of a state decides how soon it reaches a solution.
+A move ordering is one or more comma-separated policies, applied in order (later policies break ties):
+- fixed: the directions in the base order (U, D, L, R by default)
+- heuristic: children with the lowest heuristic first
+- push: moves that push a box first
+- inertia: moves that continue in the direction of the previous move first
+- killer: the move that was last rewarded at the same depth first
+- history: moves that were rewarded most often from the same player position first
+Killer and history moves are learned from reward() calls made by the search, so only the searches that reward moves
+(dfs_limited_depth, iddfs and idas) can use them; dfs cannot (see supports_ordering()).
+Moves that simply undo the previous (non-push) move lead back to the parent state and are pruned.
+"""
+
+DIRECTIONS = ['U', 'D', 'L', 'R']
+DELTAS = {'U': (-1, 0), 'D': (1, 0), 'L': (0, -1), 'R': (0, 1)}
+INVERSE = {'U': 'D', 'D': 'U', 'L': 'R', 'R': 'L'}
+POLICIES = ['fixed', 'heuristic', 'push', 'inertia', 'killer', 'history']
+# Policies learned from reward(), which dfs never calls (they would act like fixed there)
+LEARNED_POLICIES = ['killer', 'history']
+
+
+def supports_ordering(strategy, policy):
+    """Check if the strategy can use the move ordering: killer and history need a search that rewards moves"""
+    if strategy != 'dfs':
+        return True
+    return not any(name.strip() in LEARNED_POLICIES for name in policy.split(','))
+
+
+class MoveOrdering(object):
+    def __init__(self, policy='fixed', prune_inverse=True, directions=DIRECTIONS):
+        self.policies = [name.strip() for name in policy.split(',') if name.strip()]
+        for name in self.policies:
+            if name not in POLICIES:
+                raise Exception(f'Invalid move ordering: {name}')
+        self.policy = ','.join(self.policies)
+        self.prune_inverse = prune_inverse
+        # Base order of the directions; the policies sort the children stably, so it also breaks their ties
+        self.directions = directions
+        self.killers = {}
+        self.history = {}
+        self.pruned_moves = 0
+
+    def children(self, state, depth=0, last_move=None, last_push=False):
+        """Get the valid children of the state as (direction, child state, is push) tuples, in search order
+            Note: last_move and last_push describe the move that led to the state, and are used for inverse-move
+            pruning and inertia
+        """
+        undo = INVERSE[last_move] if self.prune_inverse and last_move is not None and not last_push else None
+        children = []
+        for direction in self.directions:
+            if direction == undo:
+                # Walking back without a push returns to the parent state
+                self.pruned_moves += 1
+                continue
+            new_state = state.move(direction)
+            if new_state is state:
+                continue
+            dx, dy = DELTAS[direction]
+            is_push = state.is_box((state.player[0] + dx, state.player[1] + dy))
+            children.append((direction, new_state, is_push))
+
+        if self.policies != ['fixed']:
+            children.sort(key=lambda child: self.sort_key(state, depth, last_move, child))
+        return children
+
+    def sort_key(self, state, depth, last_move, child):
+        direction, new_state, is_push = child
+        key = []
+        for name in self.policies:
+            if name == 'heuristic':
+                key.append(new_state.get_heuristic())
+            elif name == 'push':
+                key.append(0 if is_push else 1)
+            elif name == 'inertia':
+                key.append(0 if direction == last_move else 1)
+            elif name == 'killer':
+                key.append(0 if self.killers.get(depth) == direction else 1)
+            elif name == 'history':
+                key.append(-self.history.get((state.player, direction), 0))
+        return key
+
+    def reward(self, state, depth, direction):
+        """Record that the move in the given direction from the state (at the given depth) was a good one"""
+        self.killers[depth] = direction
+        key = (state.player, direction)
+        self.history[key] = self.history.get(key, 0) + 1
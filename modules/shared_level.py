@@ -0,0 +1,233 @@
+"""
+Shared-memory level store for solving one level in several worker processes
+The static grid and the level tables (see level_tables.py) are written once into a block of shared memory. Workers
+attach to the block by name and read the tables through zero-copy, read-only views, so they neither unpickle the map
+nor rebuild the tables. States are sent between processes in a compact form: the floor indices of the player and
+of the boxes, as unsigned 16-bit integers.
+Block layout (every section starts at a multiple of 8 bytes):
+- header: magic b'SKB1', height, width, number of floor cells (little-endian uint32)
+- grid: height * width bytes
+- floor_index, distance: height * width int32 each
+- floor_cells: number of floor cells int32 (cell index of each floor cell)
+- dead: height * width bytes
+The store class has the following methods:
+- create(state): create the store of the state's level (the creating process must unlink() it when done)
+- attach(name): attach to an existing store
+- encode_state(state) / decode_state(data): convert a state to and from its compact form
+- game_state(data, heuristic): build the GameState of a compact state
+The module also solves a level with several strategies in parallel with solve_in_workers().
+"""
+
+import contextlib
+import io
+import multiprocessing
+import queue
+import struct
+import time
+from array import array
+from multiprocessing import shared_memory
+from modules.game_state import GameState
+from modules.level_tables import LevelTables
+
+MAGIC = b'SKB1'
+HEADER = struct.Struct('<4sIII')
+# Seconds between checks for workers that died without reporting a result
+POLL_INTERVAL = 0.5
+
+
+def align(offset):
+    return (offset + 7) & ~7
+
+
+def layout(height, width, floor_count):
+    """Get the (offset, size) of each section of the block, and the total size"""
+    cells = height * width
+    sections = {}
+    offset = align(HEADER.size)
+    for name, size in [('grid', cells), ('floor_index', 4 * cells), ('distance', 4 * cells),
+                       ('floor_cells', 4 * floor_count), ('dead', cells)]:
+        sections[name] = (offset, size)
+        offset = align(offset + size)
+    return sections, max(offset, 1)
+
+
+class SharedLevelStore(object):
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        magic, self.height, self.width, floor_count = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC:
+            raise Exception(f'Not a sokoban level store: {shm.name}')
+        sections, _ = layout(self.height, self.width, floor_count)
+        views = {}
+        for name, (offset, size) in sections.items():
+            view = shm.buf[offset:offset + size]
+            if name in ['floor_index', 'distance', 'floor_cells']:
+                view = view.cast('i')
+            views[name] = view.toreadonly()
+        self.views = views
+        self.floor_cells = views['floor_cells']
+        self.tables = LevelTables(self.height, self.width, views['grid'], views['floor_index'], views['distance'],
+                                  views['dead'])
+
+    @classmethod
+    def create(cls, state, tables=None):
+        """Create a store holding the static layout and the tables of the state's level"""
+        tables = tables if tables is not None else LevelTables.build(state)
+        cells = tables.height * tables.width
+        floor_cells = [-1] * sum(1 for index in tables.floor_index if index != -1)
+        for cell in range(cells):
+            if tables.floor_index[cell] != -1:
+                floor_cells[tables.floor_index[cell]] = cell
+        sections, size = layout(tables.height, tables.width, len(floor_cells))
+
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        HEADER.pack_into(shm.buf, 0, MAGIC, tables.height, tables.width, len(floor_cells))
+        for name, data in [('grid', bytes(tables.grid)), ('floor_index', array('i', tables.floor_index).tobytes()),
+                           ('distance', array('i', tables.distance).tobytes()),
+                           ('floor_cells', array('i', floor_cells).tobytes()), ('dead', bytes(tables.dead))]:
+            offset, section_size = sections[name]
+            shm.buf[offset:offset + section_size] = data
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Attach to the store with the given name"""
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        """Release the views and detach from the block"""
+        self.tables = None
+        self.floor_cells = None
+        for view in self.views.values():
+            view.release()
+        self.views = {}
+        self.shm.close()
+
+    def unlink(self):
+        """Free the block (only the creating process should do this, after all workers are done)"""
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        if self.owner:
+            self.unlink()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # The following methods convert states to and from their compact form
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def encode_state(self, state):
+        """Get the compact form of the state: uint16 floor indices of the player and of the (sorted) boxes"""
+        floor_index, width = self.tables.floor_index, self.width
+        return array('H', [floor_index[state.player[0] * width + state.player[1]]] +
+                     sorted(floor_index[row * width + col] for row, col in state.boxes)).tobytes()
+
+    def decode_state(self, data):
+        """Get the (player, boxes) positions of a compact state"""
+        indices = array('H')
+        indices.frombytes(data)
+        positions = [divmod(self.floor_cells[index], self.width) for index in indices]
+        return positions[0], sorted(positions[1:])
+
+    def game_state(self, data, heuristic='manhattan', current_cost=0):
+        """Build the GameState of a compact state (with the shared tables if the heuristic is 'pushdist')"""
+        player, boxes = self.decode_state(data)
+        grid, width = self.tables.grid, self.width
+        map = [[chr(grid[row * width + col]) for col in range(width)] for row in range(self.height)]
+        for row, col in boxes:
+            map[row][col] = '*' if map[row][col] == '.' else '$'
+        row, col = player
+        map[row][col] = '+' if map[row][col] == '.' else '@'
+        return GameState(map, current_cost, self.tables if heuristic == 'pushdist' else None)
+
+
+def worker_solve(store_name, data, index, strategy, options, results):
+    # Entry point of a worker process: attach to the level store and solve the compact state
+    # Puts (index, strategy, solution, statistics) on the results queue; statistics has an 'error' if the search failed
+    from modules.solver import Solver
+
+    start_time = time.time()
+    store = SharedLevelStore.attach(store_name)
+    try:
+        # The auto strategy analyzes the level with the tables, so it gets them whatever its heuristic
+        heuristic = options.get('heuristic') or 'manhattan'
+        state = store.game_state(data, 'pushdist' if strategy == 'auto' else heuristic)
+        startup_time = time.time() - start_time
+        solver = Solver(state, strategy, **options)
+        with contextlib.redirect_stdout(io.StringIO()):
+            solver.solve()
+        results.put((index, strategy, solver.get_solution(), {
+            'states_generated': solver.states_generated,
+            'expanded_nodes': solver.expanded_nodes,
+            'time': solver.time,
+            'startup_time': startup_time,
+        }))
+    except Exception as error:
+        results.put((index, strategy, None, {'error': f'{type(error).__name__}: {error}'}))
+    finally:
+        store.close()
+
+
+def solve_in_workers(state, strategies, **options):
+    """Solve the state with each strategy in its own worker process, sharing one level store between them
+        Returns (strategy, solution, statistics) of the first worker that found a solution, or None
+        Note: a worker that fails, or dies without reporting (e.g. killed when out of memory), counts as finished
+        without a solution. With a checkpoint path, each worker checkpoints to (and resumes from) its own file, the
+        path followed by '.' and the strategy.
+    """
+    from modules.solver import STRATEGIES
+
+    for strategy in strategies:
+        if strategy not in STRATEGIES:
+            raise Exception(f'Invalid strategy: {strategy}')
+    if len(set(strategies)) != len(strategies):
+        raise Exception('Invalid strategies: each strategy can only run once')
+
+    with SharedLevelStore.create(state) as store:
+        data = store.encode_state(state)
+        results = multiprocessing.Queue()
+        workers = []
+        for index, strategy in enumerate(strategies):
+            worker_options = dict(options)
+            if options.get('checkpoint') is not None:
+                worker_options['checkpoint'] = f"{options['checkpoint']}.{strategy}"
+            workers.append(multiprocessing.Process(target=worker_solve, args=(store.name, data, index, strategy,
+                                                                              worker_options, results)))
+        for worker in workers:
+            worker.start()
+        found = None
+        finished = set()
+        # Workers seen dead at the previous poll; a result put just before exiting arrives within one poll
+        dead = set()
+        try:
+            while found is None and len(finished) < len(workers):
+                try:
+                    index, strategy, solution, stats = results.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    for index, worker in enumerate(workers):
+                        if index in finished or worker.is_alive():
+                            continue
+                        if index in dead:
+                            print(f"Worker {strategies[index]} exited with code {worker.exitcode} without a result")
+                            finished.add(index)
+                        dead.add(index)
+                    continue
+                finished.add(index)
+                if 'error' in stats:
+                    print(f"Worker {strategy} failed: {stats['error']}")
+                elif solution is not None:
+                    found = (strategy, solution, stats)
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
+        return found
@@ -0,0 +1,185 @@
+"""
+Post-optimizer for solutions found by the sokoban solver
+Solutions found by dfs, greedy or other non-optimal strategies often wander around the map. The optimizer shortens
+a move list in three passes:
+- remove cycles: moves between two visits of the same state are dropped
+- compress walks: the player's walk before each push is replaced by a shortest path to the pushing position
+- reorder pushes: a bounded local search swaps adjacent pushes of different boxes when the walks get shorter
+Each pass runs in time proportional to the length of the solution (times the size of the map for the walks).
+The optimizer class has the following methods:
+- optimize(moves): get a shortened move list that still solves the level
+"""
+
+from collections import deque
+
+DELTAS = {'U': (-1, 0), 'D': (1, 0), 'L': (0, -1), 'R': (0, 1)}
+
+
+class SolutionOptimizer(object):
+    def __init__(self, initial_state, max_passes=2):
+        self.walls = {(row, col) for row in range(initial_state.height) for col in range(initial_state.width)
+                      if initial_state.is_wall((row, col))}
+        self.height = initial_state.height
+        self.width = initial_state.width
+        self.player = initial_state.player
+        self.boxes = frozenset(initial_state.boxes)
+        self.targets = frozenset(initial_state.targets)
+        self.max_passes = max_passes
+
+    def optimize(self, moves):
+        """Get a shortened move list that still solves the level, or the original moves if they can't be improved"""
+        if not moves:
+            return moves
+        shortened = self.remove_cycles(moves)
+        pushes = self.get_pushes(shortened)
+        pushes = self.reorder_pushes(pushes)
+        optimized = self.remove_cycles(self.get_moves(pushes))
+        if len(optimized) >= len(moves) or not self.solves(optimized):
+            return moves
+        return optimized
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # The following methods replay moves on compact states (player position, frozenset of box positions)
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def step(self, player, boxes, direction):
+        """Get the state after moving in the given direction, the same state if the move is invalid"""
+        dx, dy = DELTAS[direction]
+        new_player = (player[0] + dx, player[1] + dy)
+        if new_player in self.walls:
+            return player, boxes
+        if new_player in boxes:
+            beyond = (new_player[0] + dx, new_player[1] + dy)
+            if beyond in self.walls or beyond in boxes:
+                return player, boxes
+            boxes = (boxes - {new_player}) | {beyond}
+        return new_player, boxes
+
+    def solves(self, moves):
+        player, boxes = self.player, self.boxes
+        for direction in moves:
+            player, boxes = self.step(player, boxes, direction)
+        return boxes <= self.targets
+
+    def walk(self, start, goal, boxes):
+        """Get the shortest list of moves for the player from start to goal around walls and boxes, None if unreachable"""
+        if start == goal:
+            return []
+        parents = {start: None}
+        queue = deque([start])
+        while queue:
+            position = queue.popleft()
+            for direction, (dx, dy) in DELTAS.items():
+                neighbour = (position[0] + dx, position[1] + dy)
+                if neighbour in parents or neighbour in self.walls or neighbour in boxes:
+                    continue
+                if not (0 <= neighbour[0] < self.height and 0 <= neighbour[1] < self.width):
+                    continue
+                parents[neighbour] = (position, direction)
+                if neighbour == goal:
+                    path = []
+                    while parents[neighbour] is not None:
+                        neighbour, direction = parents[neighbour]
+                        path.append(direction)
+                    return path[::-1]
+                queue.append(neighbour)
+        return None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # The following methods are the optimization passes
+    # A solution is described by its pushes: (position the player pushes from, direction) tuples
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def remove_cycles(self, moves):
+        """Drop the moves between two visits of the same state (and moves that don't change the state)"""
+        player, boxes = self.player, self.boxes
+        states = [(player, boxes)]
+        index_of = {(player, boxes): 0}
+        kept = []
+        for direction in moves:
+            player, boxes = self.step(player, boxes, direction)
+            state = (player, boxes)
+            index = index_of.get(state)
+            if index is None:
+                index_of[state] = len(states)
+                states.append(state)
+                kept.append(direction)
+            else:
+                # Back to an earlier state: forget everything after it
+                for dropped in states[index + 1:]:
+                    del index_of[dropped]
+                del states[index + 1:]
+                del kept[index:]
+        return kept
+
+    def get_pushes(self, moves):
+        player, boxes = self.player, self.boxes
+        pushes = []
+        for direction in moves:
+            new_player, new_boxes = self.step(player, boxes, direction)
+            if new_boxes is not boxes:
+                pushes.append((player, direction))
+            player, boxes = new_player, new_boxes
+        return pushes
+
+    def get_moves(self, pushes):
+        """Rebuild the move list from the pushes, walking the shortest path to each pushing position"""
+        player, boxes = self.player, self.boxes
+        moves = []
+        for position, direction in pushes:
+            moves += self.walk(player, position, boxes)
+            moves.append(direction)
+            player, boxes = self.step(position, boxes, direction)
+        return moves
+
+    def push(self, player, boxes, push):
+        """Apply a push from the state, returns (walk length, new player position, new boxes) or None if invalid"""
+        position, direction = push
+        dx, dy = DELTAS[direction]
+        box = (position[0] + dx, position[1] + dy)
+        beyond = (box[0] + dx, box[1] + dy)
+        if position in boxes or box not in boxes or beyond in boxes or beyond in self.walls:
+            return None
+        walk = self.walk(player, position, boxes)
+        if walk is None:
+            return None
+        return len(walk), box, (boxes - {box}) | {beyond}
+
+    def cost(self, player, boxes, pushes):
+        """Get the number of moves to make the pushes in order from the state, None if they are not all valid"""
+        total = 0
+        for push in pushes:
+            result = self.push(player, boxes, push)
+            if result is None:
+                return None
+            walk_length, player, boxes = result
+            total += walk_length + 1
+        return total
+
+    def reorder_pushes(self, pushes):
+        """Bounded local search: swap adjacent pushes of different boxes when that shortens the walks around them
+            Note: swapping pushes i and i + 1 only changes the walks to pushes i, i + 1 and i + 2, so each candidate is
+            evaluated locally
+        """
+        pushes = list(pushes)
+        for _ in range(self.max_passes):
+            improved = False
+            player, boxes = self.player, self.boxes
+            for i in range(len(pushes) - 1):
+                first, second = pushes[i], pushes[i + 1]
+                dx, dy = DELTAS[first[1]]
+                first_box_after = (first[0][0] + 2 * dx, first[0][1] + 2 * dy)
+                dx, dy = DELTAS[second[1]]
+                second_box = (second[0][0] + dx, second[0][1] + dy)
+                if first_box_after != second_box:
+                    window = pushes[i:i + 3]
+                    swapped = [second, first] + pushes[i + 2:i + 3]
+                    old_cost = self.cost(player, boxes, window)
+                    new_cost = self.cost(player, boxes, swapped)
+                    if new_cost is not None and new_cost < old_cost:
+                        pushes[i], pushes[i + 1] = second, first
+                        improved = True
+                _, player, boxes = self.push(player, boxes, pushes[i])
+            if not improved:
+                break
+        return pushes
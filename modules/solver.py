@@ -1,21 +1,59 @@
 # Solver for sokuban game using following search strategies:
 # - Breadth-first search
 # - Depth-first search
+# - Depth-limited and iterative-deepening depth-first search
 # - A* search
 # - Uniform-cost search
 # - Greedy search
 # - IDA* search
+# - Automatic choice of strategy, heuristic and budget from a quick analysis of the level (see level_analyzer.py)
 # The solver class has the following methods:
 # - solve(): solve the game
+# Visited states are compared in canonical form under the rotations and reflections of the level (see symmetry.py)
+# BFS and A* searches can be checkpointed to a file and resumed from it (see checkpoint.py)
 # """
 
+import os
 import time
 from collections import deque
 from queue import PriorityQueue
 from heapq import *
+from modules.symmetry import LevelSymmetry, ORIENTATIONS
+from modules.move_ordering import MoveOrdering, supports_ordering
+from modules.closed_set import make_closed_set, UNKNOWN
+from modules.solution_optimizer import SolutionOptimizer
+from modules.game_state import GameState
+from modules.level_tables import LevelTables
+from modules.level_analyzer import LevelAnalyzer, load_benchmark_results
+from modules.checkpoint import CheckpointWriter, load_checkpoint, level_checksum, rebuild_state
+
+STRATEGIES = ['bfs', 'dfs', 'dfs_limited_depth', 'iddfs', 'astar', 'ucs', 'greedy', 'idas', 'auto']
+CHECKPOINT_STRATEGIES = ['bfs', 'astar']
+# Base direction order of idas (the other strategies use U, D, L, R)
+IDAS_DIRECTIONS = ['U', 'D', 'R', 'L']
+
+
+def default_ordering(strategy):
+    """Get the move ordering used by a strategy when none is given"""
+    return 'heuristic' if strategy in ['dfs_limited_depth', 'iddfs'] else 'fixed'
+
+
+def new_move_ordering(strategy, policy=None):
+    """Get the move ordering of a strategy (its default if policy is None)"""
+    policy = policy if policy is not None else default_ordering(strategy)
+    if not supports_ordering(strategy, policy):
+        raise Exception(f'Invalid move ordering for {strategy}: {policy} (killer and history need dfs_limited_depth, '
+                        f'iddfs or idas)')
+    if strategy == 'idas':
+        return MoveOrdering(policy, directions=IDAS_DIRECTIONS)
+    return MoveOrdering(policy)
+
 
 class Solver(object):
-    def __init__(self, initial_state, strategy, map_name=''):
+    def __init__(self, initial_state, strategy, map_name='', symmetry=True, max_depth=10, depth_start=1, depth_step=1,
+                 cycle_check='depth', move_ordering=None, closed_set='exact',
+                 optimize=False, heuristic=None, max_expansions=None, calibration=None, checkpoint=None,
+                 checkpoint_interval=60, resume=False):
         self.initial_state = initial_state
         self.strategy = strategy
         self.solution = None
@@ -23,29 +61,159 @@ class Solver(object):
         self.states_generated = 0
         self.expanded_nodes = 0
         self.moves_to_target = 0
+        self.symmetric_states_merged = 0
 
         self.map_name = map_name
 
+        # Depth-limited and iterative-deepening DFS settings
+        # cycle_check is 'depth' (map of the shallowest depth per state) or 'path' (states on the current path only)
+        if depth_start < 0:
+            raise Exception(f'Invalid depth start: {depth_start} (must be at least 0)')
+        if depth_step < 1:
+            raise Exception(f'Invalid depth step: {depth_step} (must be at least 1)')
+        self.max_depth = max_depth
+        self.depth_start = depth_start
+        self.depth_step = depth_step
+        self.cycle_check = cycle_check
+        self.iteration_stats = []
+
+        # Order in which dfs, dfs_limited_depth, iddfs and idas try the children of a state (see move_ordering.py)
+        # None for the default of the strategy (chosen again once the 'auto' strategy has picked one)
+        self.requested_ordering = move_ordering
+        self.move_ordering = new_move_ordering(strategy, move_ordering)
+
+        # Closed set backend ('exact', 'fingerprint', 'bloom' or 'bitstate', see closed_set.py) for visited states
+        self.closed_set_spec = closed_set
+        self.closed_set = None
+
+        # Benchmark results (see benchmark.py --save) used to calibrate the 'auto' strategy
+        self.calibration = calibration
+        self.analyzer = None
+        self.fallback = None
+
+        # Heuristic: 'manhattan' (Manhattan distances) or 'pushdist' (push distances from the level tables), None to
+        # keep the heuristic of the initial state. Level tables that come with the initial state (e.g. the shared ones
+        # of a worker process, see shared_level.py) are kept for the analysis and the heuristic instead of rebuilt.
+        self.level_tables = initial_state.tables
+        self.requested_heuristic = heuristic
+        if heuristic is not None:
+            self.use_heuristic(heuristic)
+        self.heuristic = 'pushdist' if self.initial_state.tables is not None else 'manhattan'
+
+        # Search budget: searches give up once they have expanded max_expansions nodes (None for no limit)
+        self.requested_max_expansions = max_expansions
+        self.max_expansions = max_expansions
+        self.budget_exhausted = False
+
+        # Shorten the solution after the search (see solution_optimizer.py)
+        self.optimize = optimize
+        self.unoptimized_length = None
+        self.optimize_time = None
+
+        # Checkpoints of bfs and astar searches: file path (None to disable), interval in seconds, and whether to
+        # continue from the checkpoint file
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.resume = resume
+        self.checkpoint_writer = None
+        self.checkpoint_pause = None
+        self.resumed = False
+
+        # Rotations and reflections that leave walls and targets unchanged; states are canonicalized under this
+        # group before the visited-set lookup, so mirror images of an already visited state are not searched again.
+        self.symmetry = LevelSymmetry(initial_state, detect=symmetry)
+
     def solve(self):
         start_time = time.time()
+        if self.strategy == 'auto':
+            self.select_strategy()
+        if self.checkpoint is not None and self.strategy not in CHECKPOINT_STRATEGIES:
+            print(f"Checkpoints are only supported by {', '.join(CHECKPOINT_STRATEGIES)}, not by {self.strategy}")
+        self.solution = self.search()
+        self.close_checkpoints()
+        if self.solution is None and self.budget_exhausted and self.fallback is not None:
+            print(f"Search budget of {self.max_expansions} expanded nodes exhausted, falling back to {self.fallback}")
+            self.strategy = self.fallback
+            self.max_expansions = None
+            self.budget_exhausted = False
+            self.solution = self.search()
+            self.close_checkpoints()
+        self.time = time.time() - start_time
+        if self.optimize and self.solution is not None:
+            self.optimize_solution()
+        self.print_solution()
+
+    def search(self):
         if self.strategy == 'bfs':
-            self.solution = self.bfs()
+            return self.bfs()
         elif self.strategy == 'dfs':
-            self.solution = self.dfs()
+            return self.dfs()
         elif self.strategy == 'dfs_limited_depth':
-            self.solution = self.dfs_limited_depth()
+            return self.dfs_limited_depth()
+        elif self.strategy == 'iddfs':
+            return self.iddfs()
         elif self.strategy == 'astar':
-            self.solution = self.astar()
+            return self.astar()
         elif self.strategy == 'ucs':
-            self.solution = self.ucs()
+            return self.ucs()
         elif self.strategy == 'greedy':
-            self.solution = self.greedy()
+            return self.greedy()
         elif self.strategy == 'idas':
-            self.solution = self.idas()
+            return self.idas()
         else:
             raise Exception('Invalid strategy')
-        self.time = time.time() - start_time
-        self.print_solution()
+
+    def use_heuristic(self, heuristic):
+        """Switch the initial state (and so every state generated from it) to the given heuristic"""
+        state = self.initial_state
+        if heuristic == 'manhattan':
+            tables = None
+        elif heuristic == 'pushdist':
+            tables = state.tables if state.tables is not None else self.level_tables
+            if tables is None:
+                tables = self.analyzer.tables if self.analyzer is not None else LevelTables.build(state)
+        else:
+            raise Exception('Invalid heuristic')
+        if tables is not state.tables:
+            self.initial_state = GameState(state.map, state.current_cost, tables)
+        self.heuristic = heuristic
+
+    def select_strategy(self):
+        """Choose the strategy, heuristic, move ordering and budget from a quick analysis of the level (the 'auto' strategy)"""
+        self.analyzer = LevelAnalyzer(self.initial_state, self.level_tables)
+        features = self.analyzer.analyze()
+        choice = self.analyzer.choose(load_benchmark_results(self.calibration))
+        print("Level features:", ', '.join(f"{name} {value if not isinstance(value, float) else round(value, 3)}"
+                                           for name, value in features.items()))
+        # The heuristic, move ordering and budget given explicitly are kept
+        self.strategy = choice['strategy']
+        if self.requested_heuristic is None:
+            self.use_heuristic(choice['heuristic'])
+        if self.requested_max_expansions is None:
+            self.max_expansions = choice['max_expansions']
+            self.fallback = choice['fallback']
+        print(f"Auto-selected strategy {self.strategy} with heuristic {self.heuristic} and budget "
+              f"{self.max_expansions} expanded nodes: {choice['reason']}")
+        ordering = self.requested_ordering if self.requested_ordering is not None else choice['ordering']
+        if ordering is not None and not supports_ordering(self.strategy, ordering):
+            print(f"Move ordering {ordering} is not supported by {self.strategy}, using its default")
+            ordering = None
+        self.move_ordering = new_move_ordering(self.strategy, ordering)
+
+    def out_of_budget(self):
+        """Check if the search has used up its budget of expanded nodes"""
+        if self.max_expansions is not None and self.expanded_nodes >= self.max_expansions:
+            self.budget_exhausted = True
+            return True
+        return False
+
+    def optimize_solution(self):
+        """Shorten the stored solution: remove cycles, compress walks between pushes and reorder pushes"""
+        start_time = time.time()
+        self.unoptimized_length = len(self.solution)
+        self.solution = SolutionOptimizer(self.initial_state).optimize(self.solution)
+        self.moves_to_target = len(self.solution)
+        self.optimize_time = time.time() - start_time
 
     def print_solution(self):
         if self.solution is not None:
@@ -54,18 +222,142 @@ class Solver(object):
             print(f"{self.map_name}, {self.strategy} > Number of expanded nodes:", self.expanded_nodes)
             print(f"{self.map_name}, {self.strategy} > Number of moves to reach the target state:", self.moves_to_target)
             print(f"{self.map_name}, {self.strategy} > Running time to find the solution:", self.time, "seconds")
+            if self.unoptimized_length is not None:
+                print(f"{self.map_name}, {self.strategy} > Solution length before and after post-optimization: "
+                      f"{self.unoptimized_length} -> {self.moves_to_target} moves ({self.optimize_time} seconds)")
+            if self.strategy in ['dfs', 'dfs_limited_depth', 'iddfs', 'idas']:
+                print(f"{self.map_name}, {self.strategy} > Move ordering:", self.move_ordering.policy)
+                print(f"{self.map_name}, {self.strategy} > Number of inverse moves pruned:", self.move_ordering.pruned_moves)
+            if not self.symmetry.is_trivial():
+                print(f"{self.map_name}, {self.strategy} > Level symmetries:", ', '.join(self.symmetry.names))
+                print(f"{self.map_name}, {self.strategy} > Number of symmetric states merged:", self.symmetric_states_merged)
+            if self.resumed:
+                print(f"{self.map_name}, {self.strategy} > Resumed from checkpoint:", self.checkpoint)
         else:
             print(f"{self.map_name}, {self.strategy} > No solution found.")
+            if self.budget_exhausted:
+                print(f"{self.map_name}, {self.strategy} > Search budget of {self.max_expansions} expanded nodes exhausted.")
+        if self.closed_set is not None:
+            print(f"{self.map_name}, {self.strategy} > Closed set: {self.closed_set.name}, {len(self.closed_set)} states, "
+                  f"{self.closed_set.bytes_per_state():.1f} bytes per state, "
+                  f"false-positive rate {self.closed_set.false_positive_rate():.3g}")
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # The following methods keep track of visited states, keyed by their canonical form under the level's symmetries
+    # The visited set maps each canonical key to the orientation of the first state that reached it
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def new_closed_set(self):
+        """Create an empty visited set with the configured backend"""
+        self.closed_set = make_closed_set(self.closed_set_spec)
+        return self.closed_set
+
+    def is_visited(self, visited, state):
+        """Check if the state, or one of its symmetric images, has been visited"""
+        key, orientation = self.symmetry.canonicalize(state)
+        visited_orientation = visited.get(key)
+        if visited_orientation is None:
+            return False
+        if visited_orientation != orientation and visited_orientation != UNKNOWN:
+            # Same canonical key from a different orientation: this is a mirror image of the visited state
+            self.symmetric_states_merged += 1
+        return True
+
+    def mark_visited(self, visited, state):
+        """Mark the state as visited, returns False if it (or one of its symmetric images) was already visited"""
+        key, orientation = self.symmetry.canonicalize(state)
+        visited_orientation = visited.get(key)
+        if visited_orientation is None:
+            visited.add(key, orientation)
+            return True
+        if visited_orientation != orientation and visited_orientation != UNKNOWN:
+            self.symmetric_states_merged += 1
+        return False
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # The following methods save and restore checkpoints of the bfs and astar searches (see checkpoint.py)
+    # A frontier entry is a (priority, counter, state, path) tuple; priority and counter are None for bfs
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def checkpoint_metadata(self):
+        return {
+            'level': level_checksum(self.initial_state),
+            'strategy': self.strategy,
+            'heuristic': self.heuristic,
+            'closed_set': self.closed_set_spec,
+            'symmetries': self.symmetry.names,
+            'width': self.initial_state.width,
+            'boxes': len(self.initial_state.boxes),
+        }
+
+    def start_checkpoints(self, visited):
+        """Start the checkpoint log (if enabled); when resuming, restore the counters and the closed set from it
+            Returns the restored frontier entries, or None if there is nothing to resume from
+        """
+        if self.checkpoint is None:
+            return None
+        metadata = self.checkpoint_metadata()
+        checkpoint = None
+        if self.resume and not os.path.exists(self.checkpoint):
+            print(f"No checkpoint found at {self.checkpoint}, starting a new search")
+        elif self.resume:
+            checkpoint = load_checkpoint(self.checkpoint)
+            for name, value in metadata.items():
+                if checkpoint.metadata[name] != value:
+                    raise Exception(f'Invalid checkpoint: it was saved with {name} {checkpoint.metadata[name]}, '
+                                    f'not {value}')
+        self.checkpoint_writer = CheckpointWriter(self.checkpoint, metadata, self.checkpoint_interval, checkpoint)
+        if checkpoint is None or not checkpoint.pushed_count:
+            return None
+
+        # Mark the logged states visited in their original order, which rebuilds the closed set exactly
+        for state in checkpoint.visited_states():
+            self.mark_visited(visited, state)
+        self.states_generated, self.expanded_nodes, self.symmetric_states_merged = checkpoint.counters
+        self.resumed = True
+        frontier = checkpoint.frontier()
+        print(f"Resuming from {self.checkpoint}: {len(frontier)} frontier states, {len(visited)} visited states")
+        start_cost = self.initial_state.current_cost
+        return [(priority, entry, rebuild_state(self.initial_state, player, boxes, start_cost + len(path)), path)
+                for priority, entry, player, boxes, path in frontier]
+
+    def save_checkpoint(self):
+        """Write a checkpoint if the checkpoint interval has passed (called at the top of the search loop)"""
+        if self.checkpoint_writer.due():
+            self.checkpoint_writer.save(self.states_generated, self.expanded_nodes, self.symmetric_states_merged)
+
+    def close_checkpoints(self):
+        """Wait for the queued checkpoints to be written"""
+        if self.checkpoint_writer is not None:
+            self.checkpoint_writer.close()
+            print(f"Wrote {self.checkpoint_writer.written} checkpoints to {self.checkpoint}, longest search pause "
+                  f"{self.checkpoint_writer.longest_pause * 1000:.2f} ms")
+            self.checkpoint_pause = self.checkpoint_writer.longest_pause
+            self.checkpoint_writer = None
 
     def bfs(self):
         print("Starting BFS")
         queue = deque([(self.initial_state, [])])
-        visited = set()
+        visited = self.new_closed_set()
         self.states_generated = 0
         self.expanded_nodes = 0
-        print(f"Initial queue: {queue}")
+        restored = self.start_checkpoints(visited)
+        log = self.checkpoint_writer
+        if restored is not None:
+            queue = deque((state, path) for _, _, state, path in restored)
+        elif log is not None:
+            log.pushed(None, self.initial_state)
+        if restored is None:
+            # A restored frontier can be huge, its size is printed when it is restored
+            print(f"Initial queue: {queue}")
         while queue:
+            if log is not None:
+                self.save_checkpoint()
             state, solution = queue.popleft()
+            if log is not None:
+                log.popped()
+            if self.out_of_budget():
+                return None
             # print(f"Exploring state with solution {solution}")
             if state.check_solved():
                 self.solution = solution
@@ -77,67 +369,173 @@ class Solver(object):
                 self.states_generated += 1
 
                 # Check if the move results in a valid state
-                if new_state not in visited:
+                if self.mark_visited(visited, new_state):
                     # print(f"Adding new state to queue with solution {solution + [direction]}")
-                    visited.add(new_state)
                     queue.append((new_state, solution + [direction]))
                     self.expanded_nodes = len(visited)
+                    if log is not None:
+                        log.pushed(direction, new_state)
         return None
 
     def dfs(self):
         print("Starting DFS")
-        stack = [(self.initial_state, [])]
-        visited = set()
+        stack = [(self.initial_state, [], False)]
+        visited = self.new_closed_set()
         self.states_generated = 0
         self.expanded_nodes = 0
         print(f"Initial stack: {stack}")
         while stack:
-            state, path = stack.pop()
+            state, path, pushed = stack.pop()
+            if not self.mark_visited(visited, state):
+                continue
             self.expanded_nodes += 1
+            if self.out_of_budget():
+                return None
             # print(f"Exploring state with solution {path}")
             if state.check_solved():
                 self.solution = path
                 self.moves_to_target = len(path)
                 return path
-            visited.add(state)
-            for direction in ['U', 'D', 'L', 'R']:
-                new_state = state.move(direction)
-                self.states_generated += 1
+            children = self.move_ordering.children(state, len(path), path[-1] if path else None, pushed)
+            self.states_generated += len(children)
+            # Push in reverse so that the first child in the move ordering is popped first
+            for direction, new_state, is_push in reversed(children):
                 # double check on valid state, not yet visited
-                if new_state is not state and new_state not in visited:
-                    stack.append((new_state, path + [direction]))
+                if not self.is_visited(visited, new_state):
+                    stack.append((new_state, path + [direction], is_push))
         return None
 
-    def dfs_limited_depth(self, max_depth=10):
-        print("Starting Depth-Limited DFS")
-        stack = [(self.initial_state, [], 0)]  # Include depth in the stack tuple
-        visited = set()
+    def dfs_limited_depth(self, max_depth=None):
+        if max_depth is None:
+            max_depth = self.max_depth
+        print(f"Starting Depth-Limited DFS with depth limit {max_depth}")
         self.states_generated = 0
         self.expanded_nodes = 0
-        while stack:
-            state, path, depth = stack.pop()
+        self.iteration_stats = []
+        path, _ = self.__depth_limited_search(max_depth)
+        return path
+
+    def iddfs(self):
+        # Iterative-deepening DFS: depth-limited searches with a growing limit, using O(depth) memory per iteration
+        limit = self.depth_start
+        self.states_generated = 0
+        self.expanded_nodes = 0
+        self.iteration_stats = []
+
+        print(f"Starting IDDFS with initial depth limit {limit}, step {self.depth_step}")
+
+        while True:
+            path, cutoff = self.__depth_limited_search(limit)
+            if path is not None:
+                return path
+            if self.budget_exhausted:
+                return None
+            if not cutoff:
+                # No branch was cut at the limit: the whole reachable state space has been searched
+                return None
+            limit += self.depth_step
+
+    def __depth_limited_search(self, limit):
+        # Depth-first search up to the given depth with an explicit stack of [state key, state, remaining children,
+        # reached the limit] frames. Moves leading into a subtree that reached the depth limit are rewarded in the
+        # move ordering, so killer and history ordering try them first in the next iteration.
+        # Duplicate states are detected either with a map of the shallowest depth each state was reached at, or only
+        # along the current path (cycle_check='path'), which keeps the memory of the search at O(depth).
+        # The closed set stores depth * ORIENTATIONS + orientation, so that pruning a mirror image of a stored state
+        # can be counted as a symmetric merge like in the other searches.
+        expanded_before = self.expanded_nodes
+        generated_before = self.states_generated
+        root_key, root_orientation = self.symmetry.canonicalize(self.initial_state)
+        if self.cycle_check == 'path':
+            shallowest_depth = None
+        else:
+            shallowest_depth = self.new_closed_set()
+            shallowest_depth.add(root_key, root_orientation)
+        on_path = {root_key: root_orientation}
+        path = []
+        cutoff = False
+        result = None
+
+        if self.initial_state.is_solved:
+            result = []
+            stack = []
+        else:
+            stack = [[root_key, self.initial_state, self.__ordered_children(self.initial_state, 0, None, False), False]]
             self.expanded_nodes += 1
-            # print(f"Exploring state with solution {path} at depth {depth}")
 
-            if depth > max_depth:
+        while stack:
+            key, state, children, reached_limit = stack[-1]
+            step = next(children, None)
+            if step is None:
+                stack.pop()
+                on_path.pop(key, None)
+                if path:
+                    if reached_limit:
+                        self.move_ordering.reward(stack[-1][1], len(stack) - 1, path[-1])
+                        stack[-1][3] = True
+                    path.pop()
                 continue
 
-            if state.check_solved():
-                self.solution = path
-                self.moves_to_target = len(path)
-                return path
+            direction, new_state, is_push = step
+            depth = len(stack)
+            new_key, orientation = self.symmetry.canonicalize(new_state)
+            if self.cycle_check == 'path':
+                if new_key in on_path:
+                    if on_path[new_key] != orientation:
+                        self.symmetric_states_merged += 1
+                    continue
+            else:
+                # A state reached again at the same or greater depth has nothing new below it within the limit
+                # (an approximate closed set without stored depths reports UNKNOWN, which is always pruned)
+                previous = shallowest_depth.get(new_key)
+                if previous == UNKNOWN:
+                    continue
+                if previous is not None and previous // ORIENTATIONS <= depth:
+                    if previous % ORIENTATIONS != orientation:
+                        self.symmetric_states_merged += 1
+                    continue
+                shallowest_depth.add(new_key, depth * ORIENTATIONS + orientation)
 
-            visited.add(state)
-            for direction in ['U', 'D', 'L', 'R']:
-                new_state = state.move(direction)
-                self.states_generated += 1
-                if new_state is not state and new_state not in visited:
-                    stack.append((new_state, path + [direction], depth + 1))
-        return None
+            if new_state.is_solved:
+                result = path + [direction]
+                break
+
+            if depth >= limit:
+                cutoff = True
+                stack[-1][3] = True
+                continue
+
+            path.append(direction)
+            on_path[new_key] = orientation
+            stack.append([new_key, new_state, self.__ordered_children(new_state, depth, direction, is_push), False])
+            self.expanded_nodes += 1
+            if self.out_of_budget():
+                break
+
+        stats = {
+            'limit': limit,
+            'expanded_nodes': self.expanded_nodes - expanded_before,
+            'states_generated': self.states_generated - generated_before,
+            'states_stored': len(on_path) if self.cycle_check == 'path' else len(shallowest_depth),
+        }
+        self.iteration_stats.append(stats)
+        print(f"Depth limit {limit}: expanded {stats['expanded_nodes']} nodes, generated {stats['states_generated']} states, "
+              f"stored {stats['states_stored']} states")
+
+        if result is not None:
+            self.solution = result
+            self.moves_to_target = len(result)
+        return result, cutoff
+
+    def __ordered_children(self, state, depth, last_move, last_push):
+        # Iterator over the valid successors of the state, in the order of the move ordering
+        children = self.move_ordering.children(state, depth, last_move, last_push)
+        self.states_generated += len(children)
+        return iter(children)
 
     def astar(self):
         print("Starting A-star")
-        visited = set()
+        visited = self.new_closed_set()
         priority_heap = []
 
         self.states_generated = 0
@@ -145,15 +543,29 @@ class Solver(object):
         # Tuple (total cost, order number of state, state object)
         initial_state_info = (self.initial_state.get_total_cost(), self.states_generated, self.initial_state, [])
         heappush(priority_heap, initial_state_info)
-
-        print(f"Initial queue: {priority_heap}")
+        restored = self.start_checkpoints(visited)
+        log = self.checkpoint_writer
+        if restored is not None:
+            # The restored entries are already a heap
+            priority_heap = restored
+        elif log is not None:
+            log.pushed(None, self.initial_state, 0, -1, initial_state_info[0])
+
+        if restored is None:
+            print(f"Initial queue: {priority_heap}")
         while priority_heap:
-            cost, _, current_node, path = heappop(priority_heap)
+            if log is not None:
+                self.save_checkpoint()
+            cost, counter, current_node, path = heappop(priority_heap)
+            if log is not None:
+                log.popped(counter)
 
-            if current_node in visited:
+            if not self.mark_visited(visited, current_node):
                 continue
 
             self.expanded_nodes += 1
+            if self.out_of_budget():
+                return None
 
             # print(f"Exploring state with solution {path} which, considering heuristics, costs {cost}")
 
@@ -163,21 +575,22 @@ class Solver(object):
                 print(f"Search successful at depth {current_node.current_cost}")
                 return path
 
-            visited.add(current_node)
             for direction in ['U', 'D', 'L', 'R']:
                 new_state = current_node.move(direction)
                 if new_state is current_node:
                     continue
 
                 self.states_generated += 1
-                if new_state not in visited:
+                if not self.is_visited(visited, new_state):
                     new_state_info = (new_state.get_total_cost(), self.states_generated, new_state, path + [direction])
                     heappush(priority_heap, new_state_info)
+                    if log is not None:
+                        log.pushed(direction, new_state, self.states_generated, counter, new_state_info[0])
         return None
 
     def astar_pq(self):
         print("Starting A-star (PriorityQueue)")
-        visited = set()
+        visited = self.new_closed_set()
         priority_queue = PriorityQueue()
 
         self.states_generated = 0
@@ -189,10 +602,12 @@ class Solver(object):
         while not priority_queue.empty():
             cost, _, current_node, path = priority_queue.get()
 
-            if current_node in visited:
+            if not self.mark_visited(visited, current_node):
                 continue
 
             self.expanded_nodes += 1
+            if self.out_of_budget():
+                return None
 
             # print(f"Exploring state with solution {path} which, considering heuristics, costs {cost}")
 
@@ -202,21 +617,19 @@ class Solver(object):
                 print(f"Search successful at depth {current_node.current_cost}")
                 return path
 
-
-            visited.add(current_node)
             for direction in ['U', 'D', 'L', 'R']:
                 new_state = current_node.move(direction)
                 if new_state is current_node:
                     continue
 
                 self.states_generated += 1
-                if new_state not in visited:
+                if not self.is_visited(visited, new_state):
                     priority_queue.put((new_state.get_total_cost(), self.states_generated, new_state, path + [direction]))
         return None
 
     def ucs(self):
         print("Starting UCS")
-        visited = set()
+        visited = self.new_closed_set()
         priority_queue = PriorityQueue()
 
         self.states_generated = 0
@@ -230,28 +643,29 @@ class Solver(object):
 
             # print(f"Exploring state with solution {path}, costing {cost}")
 
-            if current_node in visited:
+            if not self.mark_visited(visited, current_node):
                 continue
 
             self.expanded_nodes += 1
+            if self.out_of_budget():
+                return None
 
             if current_node.is_solved:
                 self.solution = path
                 self.moves_to_target = len(path)
                 return path
 
-            visited.add(current_node)
 
             for direction in ['U', 'D', 'L', 'R']:
                 new_state = current_node.move(direction)
                 self.states_generated += 1
-                if new_state is not current_node and new_state not in visited:
+                if new_state is not current_node and not self.is_visited(visited, new_state):
                     priority_queue.put((new_state.current_cost, self.states_generated, new_state, path + [direction]))
         return None
 
     def greedy(self):
         print("Starting Greedy")
-        visited = set()
+        visited = self.new_closed_set()
         priority_queue = PriorityQueue()
 
         self.states_generated = 0
@@ -265,22 +679,23 @@ class Solver(object):
 
             # print(f"Exploring state with solution {path} with heuristic {h}")
 
-            if current_node in visited:
+            if not self.mark_visited(visited, current_node):
                 continue
 
             self.expanded_nodes += 1
+            if self.out_of_budget():
+                return None
 
             if current_node.is_solved:
                 self.solution = path
                 self.moves_to_target = len(path)
                 return path
 
-            visited.add(current_node)
 
             for direction in ['U', 'D', 'L', 'R']:
                 new_state = current_node.move(direction)
                 self.states_generated += 1
-                if new_state is not current_node and new_state not in visited:
+                if new_state is not current_node and not self.is_visited(visited, new_state):
                     priority_queue.put((new_state.get_heuristic(), self.states_generated, new_state, path + [direction]))
         return None
 
@@ -298,7 +713,7 @@ class Solver(object):
 
         while mincost != float('inf'):
             # Perform a DFS search with specified bounds (threshold), which increases after each iteration.
-            path, mincost = self.__idastar_search(node_path, self.initial_state.current_cost, bound, [])
+            path, mincost = self.__idastar_search(node_path, self.initial_state.current_cost, bound, [], False)
             # print(f"Updating threshold from {bound} to {mincost}\nExpanded nodes in this iteration: {self.expanded_nodes - previous_expanded_nodes}")
             if mincost == -1:
                 return path
@@ -307,7 +722,7 @@ class Solver(object):
             bound = mincost
         return None
 
-    def __idastar_search(self, node_path, g, bound, path):
+    def __idastar_search(self, node_path, g, bound, path, pushed):
         # Recursive DFS function that assists IDA* algorithm
         state = node_path[-1]
         f = state.get_total_cost()
@@ -315,6 +730,8 @@ class Solver(object):
             return None, f
 
         self.expanded_nodes += 1
+        if self.out_of_budget():
+            return None, float('inf')
 
         # print(f"Exploring state with solution {path}, costing {f} at threshold {bound}")
 
@@ -324,21 +741,24 @@ class Solver(object):
             return path, -1
 
         min = float("inf")
-        for direction in ['U', 'D', 'R', 'L']:
-            new_state = state.move(direction)
-            if new_state is state:
-                continue
+        best_direction = None
+        children = self.move_ordering.children(state, len(path), path[-1] if path else None, pushed)
+        for direction, new_state, is_push in children:
             if new_state in node_path:
                 continue
 
             self.states_generated += 1
             node_path.append(new_state)
-            new_path, tmp = self.__idastar_search(node_path, new_state.current_cost, bound, path + [direction])
+            new_path, tmp = self.__idastar_search(node_path, new_state.current_cost, bound, path + [direction], is_push)
             if tmp == -1:
                 return new_path, -1
             if tmp < min:
                 min = tmp
+                best_direction = direction
             node_path.pop(-1)
+        if best_direction is not None:
+            # The child with the lowest cost beyond the threshold decides the next threshold
+            self.move_ordering.reward(state, len(path), best_direction)
         return None, min
 
     def get_solution(self):
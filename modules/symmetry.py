@@ -0,0 +1,93 @@
+"""
+Level symmetry detection for the sokoban solver
+A level is symmetric under a transformation (rotation or reflection) when its static layout - the walls and the
+targets - maps onto itself. Boxes and the player are not part of the static layout, so two states that are images
+of each other under such a transformation have mirrored solutions and only one of them needs to be searched.
+The symmetry class has the following methods:
+- canonicalize(state): get the canonical key of a state and the orientation that produces it
+"""
+
+# Transformations of a h x w box, as functions of (row, column, h, w).
+# Transformations that swap rows and columns only apply to square boxes.
+TRANSFORMS = [
+    ('identity', False, lambda r, c, h, w: (r, c)),
+    ('flip_vertical', False, lambda r, c, h, w: (h - 1 - r, c)),
+    ('flip_horizontal', False, lambda r, c, h, w: (r, w - 1 - c)),
+    ('rotate_180', False, lambda r, c, h, w: (h - 1 - r, w - 1 - c)),
+    ('transpose', True, lambda r, c, h, w: (c, r)),
+    ('anti_transpose', True, lambda r, c, h, w: (w - 1 - c, h - 1 - r)),
+    ('rotate_90', True, lambda r, c, h, w: (c, h - 1 - r)),
+    ('rotate_270', True, lambda r, c, h, w: (w - 1 - c, r)),
+]
+ORIENTATIONS = len(TRANSFORMS)
+
+
+def state_key(state):
+    """Get the compact key of a state: the player position and the (row-major ordered) box positions"""
+    return state.player, tuple(state.boxes)
+
+
+class LevelSymmetry(object):
+    def __init__(self, initial_state, detect=True):
+        self.names = []
+        self.position_maps = []
+        self.detect(initial_state, detect)
+
+    def detect(self, state, detect=True):
+        """Find every transformation that maps the walls and targets of the level onto themselves
+            Note: with detect=False only the identity is kept, which disables symmetry reduction
+        """
+        cells = [(r, c) for r in range(state.height) for c in range(state.width) if state.map[r][c] != ' ']
+        if not cells:
+            cells = [(0, 0)]
+        top = min(r for r, _ in cells)
+        left = min(c for _, c in cells)
+        h = max(r for r, _ in cells) - top + 1
+        w = max(c for _, c in cells) - left + 1
+
+        def static_cell(row, col):
+            if state.is_wall((row, col)):
+                return '#'
+            if state.is_target((row, col)):
+                return '.'
+            return ' '
+
+        for name, swaps_axes, transform in TRANSFORMS if detect else TRANSFORMS[:1]:
+            if swaps_axes and h != w:
+                continue
+            position_map = {}
+            symmetric = True
+            for r in range(h):
+                for c in range(w):
+                    tr, tc = transform(r, c, h, w)
+                    if static_cell(top + r, left + c) != static_cell(top + tr, left + tc):
+                        symmetric = False
+                        break
+                    position_map[(top + r, left + c)] = (top + tr, left + tc)
+                if not symmetric:
+                    break
+            if not symmetric:
+                continue
+
+            self.names.append(name)
+            self.position_maps.append(position_map)
+
+    def is_trivial(self):
+        """Check if the level only has the identity symmetry"""
+        return len(self.position_maps) == 1
+
+    def canonicalize(self, state):
+        """Get the canonical key of the state and the orientation (index of the symmetry) that produces it
+            Note: states that are images of each other under a symmetry of the level share the same canonical key
+        """
+        key = state_key(state)
+        if len(self.position_maps) == 1:
+            return key, 0
+
+        best_key, best_orientation = key, 0
+        for orientation in range(1, len(self.position_maps)):
+            position_map = self.position_maps[orientation]
+            candidate = (position_map[state.player], tuple(sorted(position_map[box] for box in state.boxes)))
+            if candidate < best_key:
+                best_key, best_orientation = candidate, orientation
+        return best_key, best_orientation
@@ -2,8 +2,10 @@
 python main.py --map maps/maps/sokoban1.txt --method bfs
 python main.py --map maps/maps/sokoban1.txt --method dfs
 python main.py --map maps/maps/sokoban1.txt --method dfs_limited_depth
+python main.py --map maps/maps/sokoban1.txt --method iddfs
 python main.py --map maps/maps/sokoban1.txt --method astar
 python main.py --map maps/maps/sokoban1.txt --method ucs
 python main.py --map maps/maps/sokoban1.txt --method greedy
 python main.py --map maps/maps/sokoban1.txt --method idas
+python main.py --map maps/maps/sokoban1.txt --method auto
 PAUSE
\ No newline at end of file
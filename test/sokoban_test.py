@@ -1,7 +1,19 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
 import unittest
 from modules.game_state import GameState
 from modules.game_visualization import GameVisualization
 from modules.solver import Solver
+from modules.symmetry import LevelSymmetry
+from modules.move_ordering import MoveOrdering, supports_ordering
+from modules.closed_set import make_closed_set, UNKNOWN
+from modules.solution_optimizer import SolutionOptimizer
+from modules.level_tables import LevelTables
+from modules.level_analyzer import LevelAnalyzer
+from modules.shared_level import SharedLevelStore, solve_in_workers
 
 # This will grab memory usage after a specific amount of time.
 # May vary on different hardware and implementation.
@@ -109,5 +121,400 @@ class SokobanTest_Sokoban2(unittest.TestCase):
     def test_custom_sokoban2(self):
         self.engine('sokoban2.txt', 'custom')
 
+class SokobanTest_DepthLimited(unittest.TestCase):
+    def solve(self, map_name, method, **search_options):
+        solver = Solver(GameState(load_map(f'maps/{map_name}')), method, **search_options)
+        solver.solve()
+        return solver
+
+    def test_iddfs_finds_shortest_solution(self):
+        bfs = self.solve('sokoban1.txt', 'bfs')
+        for cycle_check in ['depth', 'path']:
+            iddfs = self.solve('sokoban1.txt', 'iddfs', cycle_check=cycle_check)
+            self.assertEqual(len(iddfs.get_solution()), len(bfs.get_solution()))
+            self.assertEqual([stats['limit'] for stats in iddfs.iteration_stats], list(range(1, len(bfs.get_solution()) + 1)))
+
+    def test_iddfs_depth_start_and_step(self):
+        solver = self.solve('sokoban1.txt', 'iddfs', depth_start=3, depth_step=4)
+        self.assertEqual([stats['limit'] for stats in solver.iteration_stats], [3, 7, 11])
+        self.assertIsNotNone(solver.get_solution())
+
+    def test_invalid_depth_settings(self):
+        game_state = GameState(load_map('maps/sokoban1.txt'))
+        with self.assertRaises(Exception):
+            Solver(game_state, 'iddfs', depth_start=2, depth_step=0)
+        with self.assertRaises(Exception):
+            Solver(game_state, 'iddfs', depth_start=-1)
+
+    def test_symmetric_merges_are_counted(self):
+        game_state = GameState([list(row) for row in ['  ###   ',
+                                                      '  #.#   ',
+                                                      '  # ####',
+                                                      '###$ $.#',
+                                                      '#. $@###',
+                                                      '####$#  ',
+                                                      '   #.#  ',
+                                                      '   ###  ']])
+        for cycle_check in ['depth', 'path']:
+            solver = Solver(game_state, 'iddfs', cycle_check=cycle_check)
+            solver.solve()
+            unreduced = Solver(game_state, 'iddfs', cycle_check=cycle_check, symmetry=False)
+            unreduced.solve()
+            self.assertEqual(len(solver.get_solution()), len(unreduced.get_solution()))
+            self.assertGreater(solver.symmetric_states_merged, 0)
+            self.assertEqual(unreduced.symmetric_states_merged, 0)
+
+    def test_depth_limit_is_respected(self):
+        self.assertIsNone(self.solve('sokoban1.txt', 'dfs_limited_depth', max_depth=7).get_solution())
+        self.assertEqual(len(self.solve('sokoban1.txt', 'dfs_limited_depth', max_depth=8).get_solution()), 8)
+
+class SokobanTest_MoveOrdering(unittest.TestCase):
+    def test_inverse_moves_are_pruned(self):
+        game_state = GameState([list(row) for row in ['######',
+                                                      '#@ $.#',
+                                                      '#    #',
+                                                      '######']])
+        ordering = MoveOrdering('fixed')
+        walked = game_state.move('R')
+        self.assertEqual([child[0] for child in ordering.children(walked, 1, 'R', False)], ['D', 'R'])
+        self.assertEqual(ordering.pruned_moves, 1)
+
+        # Walking back after a push does not return to the parent state
+        pushed = walked.move('R')
+        self.assertIn('L', [child[0] for child in ordering.children(pushed, 2, 'R', True)])
+
+    def test_pushes_first(self):
+        game_state = GameState([list(row) for row in ['######',
+                                                      '#  . #',
+                                                      '#  $ #',
+                                                      '# @  #',
+                                                      '######']])
+        children = MoveOrdering('push').children(game_state.move('R'))
+        self.assertEqual(children[0][0], 'U')
+        self.assertTrue(children[0][2])
+
+    def test_orderings_solve_the_same_level(self):
+        for ordering in ['fixed', 'heuristic', 'push', 'inertia', 'killer', 'history', 'push,heuristic']:
+            for method in ['dfs', 'iddfs', 'idas']:
+                if not supports_ordering(method, ordering):
+                    continue
+                solver = Solver(GameState(load_map('maps/sokoban1.txt')), method, move_ordering=ordering)
+                solver.solve()
+                self.assertIsNotNone(solver.get_solution())
+
+    def test_dfs_rejects_learned_orderings(self):
+        for ordering in ['killer', 'push,history']:
+            self.assertFalse(supports_ordering('dfs', ordering))
+            with self.assertRaises(Exception):
+                Solver(GameState(load_map('maps/sokoban1.txt')), 'dfs', move_ordering=ordering)
+            self.assertTrue(supports_ordering('iddfs', ordering))
+
+    def test_idas_keeps_its_direction_order(self):
+        solver = Solver(GameState(load_map('maps/sokoban1.txt')), 'idas')
+        self.assertEqual(solver.move_ordering.directions, ['U', 'D', 'R', 'L'])
+        self.assertEqual(Solver(GameState(load_map('maps/sokoban1.txt')), 'dfs').move_ordering.directions,
+                         ['U', 'D', 'L', 'R'])
+
+class SokobanTest_ClosedSet(unittest.TestCase):
+    def test_fingerprint_set_grows(self):
+        closed_set = make_closed_set('fingerprint:2')
+        keys = [((row, col), ((1, 1),)) for row in range(10) for col in range(10)]
+        for index, key in enumerate(keys):
+            self.assertTrue(closed_set.add(key, index % 8))
+        self.assertFalse(closed_set.add(keys[0], 0))
+        self.assertEqual(len(closed_set), len(keys))
+        self.assertEqual([closed_set.get(key) for key in keys], [index % 8 for index in range(len(keys))])
+        self.assertIsNone(closed_set.get(((20, 20), ((1, 1),))))
+        self.assertLessEqual(closed_set.bytes_per_state(), 2 * 10 * 2)
+
+    def test_bloom_filter(self):
+        closed_set = make_closed_set('bloom:16')
+        self.assertTrue(closed_set.add(((1, 2), ((3, 4),)), 5))
+        self.assertEqual(closed_set.get(((1, 2), ((3, 4),))), UNKNOWN)
+        self.assertIsNone(closed_set.get(((2, 1), ((3, 4),))))
+        self.assertLess(closed_set.false_positive_rate(), 1e-9)
+
+    def test_backends_find_a_solution(self):
+        solutions = {}
+        for backend in ['exact', 'fingerprint', 'bloom', 'bitstate']:
+            solver = Solver(GameState(load_map('maps/sokoban1.txt')), 'bfs', closed_set=backend)
+            solver.solve()
+            solutions[backend] = solver.get_solution()
+            self.assertEqual(solver.closed_set.name, backend)
+        self.assertEqual(solutions['fingerprint'], solutions['exact'])
+        self.assertEqual(len(solutions['bloom']), len(solutions['exact']))
+
+class SokobanTest_SolutionOptimizer(unittest.TestCase):
+    def test_walks_and_cycles_are_shortened(self):
+        game_state = GameState([list(row) for row in ['#######',
+                                                      '#@    #',
+                                                      '#  $ .#',
+                                                      '#     #',
+                                                      '#######']])
+        # Wander around (including a no-op move into the wall) before pushing the box twice to the right
+        moves = ['U', 'R', 'L', 'D', 'D', 'R', 'D', 'U', 'R', 'R', 'L', 'U', 'R', 'R']
+        optimized = SolutionOptimizer(game_state).optimize(moves)
+        self.assertEqual(optimized, ['D', 'R', 'R', 'R'])
+
+    def test_solver_reports_optimized_solution(self):
+        solver = Solver(GameState(load_map('maps/sokoban1.txt')), 'dfs', optimize=True)
+        solver.solve()
+        state = solver.initial_state
+        for direction in solver.get_solution():
+            state = state.move(direction)
+        self.assertTrue(state.is_solved)
+        self.assertLessEqual(solver.moves_to_target, solver.unoptimized_length)
+
+class SokobanTest_LevelAnalyzer(unittest.TestCase):
+    def test_push_distances_and_dead_squares(self):
+        game_state = GameState([list(row) for row in ['######',
+                                                      '#@   #',
+                                                      '# $ .#',
+                                                      '#    #',
+                                                      '######']])
+        tables = LevelTables.build(game_state)
+        width = tables.width
+        self.assertEqual(tables.distance[2 * width + 2], 2)
+        # Corners can't be left by a box
+        self.assertEqual(tables.dead[1 * width + 1], 1)
+        self.assertEqual(tables.dead[2 * width + 2], 0)
+        self.assertEqual(tables.heuristic([(2, 2)]), 2)
+        self.assertEqual(tables.heuristic([(3, 1)]), float('inf'))
+        self.assertEqual(tables.floor_size(), 12)
+
+    def test_auto_strategy(self):
+        solver = Solver(GameState(load_map('maps/sokoban1.txt')), 'auto')
+        solver.solve()
+        self.assertIsNotNone(solver.get_solution())
+        self.assertEqual(solver.analyzer.features['boxes'], 2)
+        self.assertIn(solver.strategy, ['bfs', 'astar', 'greedy'])
+        self.assertEqual(solver.heuristic, 'pushdist')
+
+    def test_calibrated_choice(self):
+        game_state = GameState(load_map('maps/sokoban1.txt'))
+        features = LevelAnalyzer(game_state).analyze()
+        results = [{'map': 'a.txt', 'features': features, 'method': 'bfs', 'heuristic': 'manhattan', 'solved': True,
+                    'expanded_nodes': 40, 'time': 0.1},
+                   {'map': 'a.txt', 'features': features, 'method': 'astar', 'heuristic': 'pushdist', 'solved': True,
+                    'expanded_nodes': 20, 'time': 0.01}]
+        choice = LevelAnalyzer(game_state).choose(results)
+        self.assertEqual((choice['strategy'], choice['heuristic'], choice['max_expansions']), ('astar', 'pushdist', 80))
+
+    def test_auto_move_ordering(self):
+        game_state = GameState(load_map('maps/sokoban1.txt'))
+        features = LevelAnalyzer(game_state).analyze()
+        records = [{'map': 'a.txt', 'features': features, 'method': 'iddfs', 'heuristic': 'manhattan',
+                    'ordering': ordering, 'solved': True, 'expanded_nodes': expanded, 'time': 0.01}
+                   for ordering, expanded in [('fixed', 30), ('push', 20)]]
+        path = os.path.join(tempfile.mkdtemp(), 'results.json')
+        with open(path, 'w') as f:
+            json.dump(records, f)
+        solver = Solver(game_state, 'auto', calibration=path)
+        solver.solve()
+        self.assertEqual((solver.strategy, solver.move_ordering.policy), ('iddfs', 'push'))
+
+        # Without orderings in the results, the chosen strategy's default ordering is used
+        for record in records:
+            del record['ordering']
+        with open(path, 'w') as f:
+            json.dump(records, f)
+        solver = Solver(game_state, 'auto', calibration=path)
+        solver.solve()
+        self.assertEqual((solver.strategy, solver.move_ordering.policy), ('iddfs', 'heuristic'))
+
+    def test_auto_keeps_explicit_settings(self):
+        solver = Solver(GameState(load_map('maps/sokoban1.txt')), 'auto', heuristic='manhattan', max_expansions=1000)
+        with contextlib.redirect_stdout(io.StringIO()):
+            solver.solve()
+        self.assertIsNotNone(solver.get_solution())
+        self.assertEqual((solver.heuristic, solver.max_expansions), ('manhattan', 1000))
+        self.assertIsNone(solver.initial_state.tables)
+
+    def test_expansion_budget(self):
+        solver = Solver(GameState(load_map('maps/sokoban2.txt')), 'astar', max_expansions=50)
+        solver.solve()
+        self.assertIsNone(solver.get_solution())
+        self.assertTrue(solver.budget_exhausted)
+        self.assertEqual(solver.expanded_nodes, 50)
+
+class SokobanTest_Symmetry(unittest.TestCase):
+    def test_mirrored_level_is_detected(self):
+        game_state = GameState([list(row) for row in ['#######',
+                                                      '#. @ .#',
+                                                      '# $ $ #',
+                                                      '#######']])
+        symmetry = LevelSymmetry(game_state)
+        self.assertEqual(symmetry.names, ['identity', 'flip_horizontal'])
+
+        # The player standing left or right of the centre is the same state up to reflection
+        left, _ = symmetry.canonicalize(game_state.move('L'))
+        right, _ = symmetry.canonicalize(game_state.move('R'))
+        self.assertEqual(left, right)
+
+    def test_merge_count_matches_skipped_mirror_states(self):
+        class RecordingSolver(Solver):
+            # Records the states each search skips, and the states it actually marks visited
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.skipped = []
+                self.marked = set()
+
+            def is_visited(self, visited, state):
+                if super().is_visited(visited, state):
+                    self.skipped.append((state.player, tuple(state.boxes)))
+                    return True
+                return False
+
+            def mark_visited(self, visited, state):
+                if super().mark_visited(visited, state):
+                    self.marked.add((state.player, tuple(state.boxes)))
+                    return True
+                self.skipped.append((state.player, tuple(state.boxes)))
+                return False
+
+        game_state = GameState([list(row) for row in ['#######',
+                                                      '#. @ .#',
+                                                      '# $ $ #',
+                                                      '#     #',
+                                                      '#######']])
+        total = 0
+        for method in ['bfs', 'dfs', 'astar', 'ucs', 'greedy']:
+            solver = RecordingSolver(game_state, method)
+            solver.solve()
+            # A skipped state that was never marked visited itself was skipped only because of its mirror image
+            mirrors = sum(1 for key in solver.skipped if key not in solver.marked)
+            self.assertEqual(solver.symmetric_states_merged, mirrors, method)
+            total += mirrors
+        self.assertGreater(total, 0)
+
+    def test_symmetric_states_are_merged(self):
+        game_state = GameState([list(row) for row in ['#######',
+                                                      '#. @ .#',
+                                                      '# $ $ #',
+                                                      '#     #',
+                                                      '#######']])
+        solver = Solver(game_state, 'bfs')
+        solver.solve()
+        unreduced = Solver(game_state, 'bfs', symmetry=False)
+        unreduced.solve()
+        self.assertEqual(len(solver.get_solution()), len(unreduced.get_solution()))
+        self.assertGreater(solver.symmetric_states_merged, 0)
+        self.assertLess(solver.expanded_nodes, unreduced.expanded_nodes)
+
+class SokobanTest_SharedLevel(unittest.TestCase):
+    def test_store_views_match_tables(self):
+        game_state = GameState(load_map('maps/sokoban2.txt'))
+        tables = LevelTables.build(game_state)
+        with SharedLevelStore.create(game_state) as store:
+            attached = SharedLevelStore.attach(store.name)
+            self.assertEqual(bytes(attached.tables.grid), tables.grid)
+            self.assertEqual(list(attached.tables.floor_index), tables.floor_index)
+            self.assertEqual(list(attached.tables.distance), tables.distance)
+            self.assertEqual(bytes(attached.tables.dead), tables.dead)
+            self.assertEqual(attached.tables.heuristic(game_state.boxes), tables.heuristic(game_state.boxes))
+            self.assertTrue(attached.tables.distance.readonly)
+            attached.close()
+
+    def test_compact_states(self):
+        game_state = GameState(load_map('maps/sokoban2.txt'))
+        with SharedLevelStore.create(game_state) as store:
+            moved = game_state.move('D')
+            data = store.encode_state(moved)
+            self.assertEqual(len(data), 2 * (1 + len(moved.boxes)))
+            rebuilt = store.game_state(data)
+            self.assertEqual((rebuilt.player, sorted(rebuilt.boxes)), (moved.player, sorted(moved.boxes)))
+            self.assertEqual(rebuilt.targets, moved.targets)
+
+    def test_workers_solve_the_level(self):
+        game_state = GameState(load_map('maps/sokoban1.txt'))
+        strategy, solution, stats = solve_in_workers(game_state, ['astar', 'bfs'], heuristic='pushdist')
+        self.assertIn(strategy, ['astar', 'bfs'])
+        self.assertEqual(len(solution), 8)
+        self.assertGreater(stats['expanded_nodes'], 0)
+
+    def test_auto_reuses_the_shared_tables(self):
+        game_state = GameState(load_map('maps/sokoban1.txt'))
+        with SharedLevelStore.create(game_state) as store:
+            solver = Solver(store.game_state(store.encode_state(game_state), 'pushdist'), 'auto')
+            with contextlib.redirect_stdout(io.StringIO()):
+                solver.solve()
+            self.assertIs(solver.analyzer.tables, store.tables)
+            self.assertEqual(solver.heuristic, 'pushdist')
+            self.assertIs(solver.initial_state.tables, store.tables)
+            self.assertEqual(len(solver.get_solution()), 8)
+            del solver
+
+    def test_failing_workers(self):
+        game_state = GameState(load_map('maps/sokoban1.txt'))
+        with self.assertRaises(Exception):
+            solve_in_workers(game_state, ['astar', 'bogus'])
+        # The bfs worker fails on the closed set backend, iddfs with path cycle checks does not use one
+        strategy, solution, _ = solve_in_workers(game_state, ['bfs', 'iddfs'], closed_set='nope', cycle_check='path')
+        self.assertEqual((strategy, len(solution)), ('iddfs', 8))
+        # When every worker fails, there is no solution (and no wait for results that never come)
+        self.assertIsNone(solve_in_workers(game_state, ['bfs', 'astar'], closed_set='nope'))
+
+class SokobanTest_Checkpoint(unittest.TestCase):
+    def resume(self, method, torn_bytes=0, **search_options):
+        path = os.path.join(tempfile.mkdtemp(), 'search.ckp')
+        uninterrupted = Solver(GameState(load_map('maps/sokoban2.txt')), method, **search_options)
+        uninterrupted.solve()
+
+        # Stop the search after 300 expansions, checkpointing at every step
+        interrupted = Solver(GameState(load_map('maps/sokoban2.txt')), method, checkpoint=path, checkpoint_interval=0,
+                             max_expansions=300, **search_options)
+        interrupted.solve()
+        self.assertIsNone(interrupted.get_solution())
+        self.assertTrue(os.path.exists(path))
+        if torn_bytes:
+            # A write cut short: the last segment is incomplete
+            with open(path, 'r+b') as f:
+                f.truncate(os.path.getsize(path) - torn_bytes)
+
+        resumed = Solver(GameState(load_map('maps/sokoban2.txt')), method, checkpoint=path, resume=True,
+                         **search_options)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            resumed.solve()
+        # The restored frontier is summarized, not printed
+        self.assertNotIn('Initial queue', output.getvalue())
+        self.assertIn('frontier states', output.getvalue())
+        self.assertTrue(resumed.resumed)
+        self.assertEqual(resumed.get_solution(), uninterrupted.get_solution())
+        self.assertEqual(resumed.expanded_nodes, uninterrupted.expanded_nodes)
+        self.assertEqual(resumed.states_generated, uninterrupted.states_generated)
+        return path
+
+    def test_resume_astar(self):
+        self.resume('astar', heuristic='pushdist', closed_set='fingerprint')
+
+    def test_resume_bfs(self):
+        self.resume('bfs')
+
+    def test_resume_after_torn_write(self):
+        self.resume('astar', torn_bytes=5)
+
+    def test_search_pause_is_bounded(self):
+        # The search only hands its log of changes to the writer thread, so the pause does not grow with the search
+        solver = Solver(GameState(load_map('maps/sokoban2.txt')), 'bfs',
+                        checkpoint=os.path.join(tempfile.mkdtemp(), 'search.ckp'), checkpoint_interval=0.01)
+        solver.solve()
+        self.assertIsNotNone(solver.get_solution())
+        self.assertLess(solver.checkpoint_pause, 0.02)
+
+    def test_parallel_checkpoints(self):
+        path = os.path.join(tempfile.mkdtemp(), 'search.ckp')
+        game_state = GameState(load_map('maps/sokoban2.txt'))
+        self.assertIsNone(solve_in_workers(game_state, ['bfs', 'astar'], checkpoint=path, checkpoint_interval=0,
+                                           max_expansions=300))
+        self.assertTrue(os.path.exists(f'{path}.bfs') and os.path.exists(f'{path}.astar'))
+        strategy, solution, _ = solve_in_workers(game_state, ['bfs', 'astar'], checkpoint=path, resume=True)
+        self.assertEqual(len(solution), 144)
+
+    def test_checkpoint_of_another_search(self):
+        path = self.resume('astar', heuristic='pushdist')
+        solver = Solver(GameState(load_map('maps/sokoban2.txt')), 'astar', checkpoint=path, resume=True)
+        with self.assertRaises(Exception):
+            solver.solve()
+
 if __name__ == '__main__':
     unittest.main()